@@ -1,37 +1,255 @@
-from flask import Flask, request, jsonify, send_file, send_from_directory
+import time
+IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, Request, Response, request, jsonify, send_file, send_from_directory
 from flask_cors import CORS
 import io
 import os
 import uuid
+import atexit
+import hashlib
+import tempfile
 import threading
-import time
 import json
 import numpy as np
-from scipy import signal
-from pesq import pesq
-from pystoi import stoi
-import warnings
-from werkzeug.utils import secure_filename
 import soundfile as sf
-import numpy as np
+from werkzeug.utils import secure_filename
 
 from models.frame_model import (
     load_trained_model,
-    enhance_audio as enhance_func
+    enhance_audio as enhance_func,
+    METRICS_MODES
 )
-from metrics.quality import segmental_snr, compute_pesq, compute_stoi
+from data.features import audio_info, SR
+from metrics.quality import calculate_metrics
+from models.batching import BatchedPredictor
+from scheduler import JobScheduler, QueueFullError, SchedulerClosedError, lower_thread_priority
+from streaming import start_stream_server, stream_stats
+from cache import ResultCache, cache_key
+from status_store import create_status_store, FINISHED_STATES
+import instrumentation
+from instrumentation import CallbackMetric, JOBS
+
+print(f"[startup] modules imported in {time.perf_counter() - IMPORT_STARTED:.2f}s")
+
+# Uploads up to this size are decoded from memory; larger ones are
+# spilled to temp/ and read from there
+UPLOAD_MEMORY_MB = float(os.environ.get('AUDIFY_UPLOAD_MEMORY_MB', 32))
+UPLOAD_MEMORY_BYTES = int(UPLOAD_MEMORY_MB * 1024 * 1024)
+
+
+class UploadRequest(Request):
+    """Request that buffers uploads in memory up to UPLOAD_MEMORY_BYTES"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Werkzeug writes anything over 500 KB to a temporary file
+        return tempfile.SpooledTemporaryFile(max_size=UPLOAD_MEMORY_BYTES, dir='temp')
+
 
 app = Flask(__name__, static_folder='../outputs', static_url_path='/outputs')
+app.request_class = UploadRequest
 CORS(app)
 
-# Global storage for processing status
-processing_status = {}
-processing_lock = threading.Lock()
+# Job status storage: "memory" (single process) or "sqlite:<path>" (shared
+# by all server processes); finished jobs expire after AUDIFY_STATUS_TTL
+STATUS_STORE = os.environ.get('AUDIFY_STATUS_STORE', 'memory')
+STATUS_TTL = float(os.environ.get('AUDIFY_STATUS_TTL', 3600))
+status_store = create_status_store(STATUS_STORE, STATUS_TTL)
+status_store.start_expiry()
+
+# Progress push: /status/<id>?wait=N long-polls on the ETag, and
+# /status/<id>/events streams Server-Sent Events. Each open request holds
+# a server thread, so both are capped in duration (clients reconnect),
+# are only held until the job itself finishes (its metrics are then
+# picked up by short polls every METRICS_POLL_SECONDS), and at most
+# MAX_WAITING are held at once. Beyond that, long polls answer at once
+# and event streams are refused with 503 (the page then polls).
+LONG_POLL_MAX_SECONDS = float(os.environ.get('AUDIFY_LONG_POLL_MAX_SECONDS', 30))
+SSE_MAX_SECONDS = float(os.environ.get('AUDIFY_SSE_MAX_SECONDS', 300))
+SSE_KEEPALIVE_SECONDS = 15
+METRICS_POLL_SECONDS = 2
+# How often a waiting request re-checks queue position, which changes
+# without the job's own status changing
+QUEUE_RECHECK_SECONDS = 1.0
+# Waitress threads serve every HTTP request. Up to MAX_WAITING of them
+# (half by default) can be held by status waits, which leaves the rest
+# for uploads, downloads and /health; raise both together.
+HTTP_THREADS = int(os.environ.get('AUDIFY_HTTP_THREADS', 16))
+MAX_WAITING = int(os.environ.get('AUDIFY_MAX_WAITING', max(1, HTTP_THREADS // 2)))
+waiting_slots = threading.BoundedSemaphore(MAX_WAITING)
+
+# Bounded worker pool for enhancement jobs
+WORKERS = int(os.environ.get('AUDIFY_WORKERS', 2))
+QUEUE_SIZE = int(os.environ.get('AUDIFY_QUEUE_SIZE', 16))
+DRAIN_TIMEOUT = float(os.environ.get('AUDIFY_DRAIN_TIMEOUT', 60))
+scheduler = JobScheduler(workers=WORKERS, queue_size=QUEUE_SIZE)
+
+# Jobs complete as soon as the enhanced file is written; quality metrics
+# ("none", "fast" without PESQ/STOI, or "full") are then computed on a
+# separate pool whose threads run at a lower CPU priority
+METRICS = os.environ.get('AUDIFY_METRICS', 'full')
+METRICS_WORKERS = int(os.environ.get('AUDIFY_METRICS_WORKERS', 1))
+METRICS_QUEUE_SIZE = int(os.environ.get('AUDIFY_METRICS_QUEUE_SIZE', 64))
+METRICS_NICE = int(os.environ.get('AUDIFY_METRICS_NICE', 10))
+metrics_scheduler = JobScheduler(workers=METRICS_WORKERS, queue_size=METRICS_QUEUE_SIZE,
+                                 name='audify-metrics',
+                                 initializer=lambda: lower_thread_priority(METRICS_NICE))
+# metrics_status values while metrics are still to come
+METRICS_PENDING = ('pending', 'running')
+# Signals waiting to be scored stay in memory up to this total; beyond
+# it, they are saved to temp/ as raw arrays until their turn
+METRICS_QUEUE_MB = float(os.environ.get('AUDIFY_METRICS_QUEUE_MB', 256))
+METRICS_QUEUE_BYTES = int(METRICS_QUEUE_MB * 1024 * 1024)
 
-# Load model on startup
-model, mean, std = load_trained_model()
+
+class QueuedSignals:
+    """A finished job's input and enhanced signals, waiting to be scored"""
+
+    _lock = threading.Lock()
+    # Total size of the signals held in memory
+    held_bytes = 0
+
+    def __init__(self, processing_id, y_noisy, enhanced):
+        size = y_noisy.nbytes + enhanced.nbytes
+        with QueuedSignals._lock:
+            in_memory = QueuedSignals.held_bytes + size <= METRICS_QUEUE_BYTES
+            if in_memory:
+                QueuedSignals.held_bytes += size
+        self.nbytes = size if in_memory else 0
+        self.path = None
+        self._arrays = (y_noisy, enhanced)
+        if not in_memory:
+            self.path = os.path.join('temp', f"{processing_id}_metrics.npz")
+            self._arrays = None
+            try:
+                np.savez(self.path, noisy=y_noisy, enhanced=enhanced)
+            except OSError:
+                self.release()
+                raise
+
+    def load(self):
+        """(y_noisy, enhanced)"""
+        if self._arrays is not None:
+            return self._arrays
+        with np.load(self.path) as f:
+            return f['noisy'], f['enhanced']
+
+    def release(self):
+        """Free the memory budget or the file in temp/"""
+        self._arrays = None
+        with QueuedSignals._lock:
+            QueuedSignals.held_bytes -= self.nbytes
+        self.nbytes = 0
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+
+@atexit.register
+def drain_jobs():
+    """
+    Stop accepting jobs and finish the queued ones, within DRAIN_TIMEOUT
+    in total. Runs at exit, and on SIGTERM from run.py.
+    """
+    deadline = time.monotonic() + DRAIN_TIMEOUT
+    scheduler.shutdown(wait=True, timeout=DRAIN_TIMEOUT)
+    # Enhancement jobs queue their metrics, so this pool closes second
+    metrics_scheduler.shutdown(wait=True, timeout=max(0.0, deadline - time.monotonic()))
+
+# Inputs longer than this are enhanced block by block in bounded memory
+STREAM_MIN_SECONDS = float(os.environ.get('AUDIFY_STREAM_MIN_SECONDS', 300))
+STREAM_BLOCK_FRAMES = int(os.environ.get('AUDIFY_STREAM_BLOCK_FRAMES', 2048))
+
+# Low-pass post-processing: "spectral" mask before the iSTFT or "time"-domain IIR
+LOWPASS = os.environ.get('AUDIFY_LOWPASS', 'spectral')
+
+# Load model on startup, optionally with quantized weights (int8/float16)
+QUANTIZATION = os.environ.get('AUDIFY_QUANTIZATION') or None
+_load_started = time.perf_counter()
+model, mean, std = load_trained_model(quantization=QUANTIZATION)
 if model is None:
     print("WARNING: No trained model found! Please run 'python backend/train.py' first.")
+else:
+    print(f"[startup] model loaded in {time.perf_counter() - _load_started:.2f}s")
+
+# Share forward passes between concurrent jobs
+BATCH_FRAMES = int(os.environ.get('AUDIFY_BATCH_FRAMES', 8192))
+BATCH_WAIT_MS = float(os.environ.get('AUDIFY_BATCH_WAIT_MS', 5))
+predictor = BatchedPredictor(model, BATCH_FRAMES, BATCH_WAIT_MS) if model is not None else None
+
+# The first job would otherwise pay for the pipeline's deferred imports
+# (scipy.signal, pystoi) and first-call setup. A dummy job runs through
+# the whole pipeline in the background instead, without being counted,
+# and /ready answers 200 only once it has finished (AUDIFY_WARMUP=0
+# skips it).
+WARMUP = os.environ.get('AUDIFY_WARMUP', '1') != '0'
+warmed_up = threading.Event()
+warmup_info = {'seconds': None, 'error': None}
+
+
+def warm_up():
+    """Enhance and score one second of synthetic audio"""
+    start = time.perf_counter()
+    try:
+        t = np.arange(SR) / SR
+        y = 0.1 * np.sin(2 * np.pi * 220 * t) + 0.01 * np.random.default_rng(0).standard_normal(SR)
+        wav = io.BytesIO()
+        sf.write(wav, y.astype(np.float32), SR, format='WAV')
+        # Kept out of /metrics and the shared batcher's stats
+        warmup_predictor = BatchedPredictor(model, BATCH_FRAMES, BATCH_WAIT_MS)
+        try:
+            with instrumentation.unrecorded():
+                enhance_func(warmup_predictor, wav.getvalue(), mean, std, output_buffer=io.BytesIO(),
+                             lowpass=LOWPASS, metrics='full')
+        finally:
+            warmup_predictor.close()
+        warmup_info['seconds'] = time.perf_counter() - start
+        print(f"[startup] warm-up finished in {warmup_info['seconds']:.2f}s")
+    except Exception as e:
+        warmup_info['error'] = str(e)
+        print(f"[startup] warm-up failed: {e}")
+    finally:
+        warmed_up.set()
+        print(f"[startup] ready {time.perf_counter() - IMPORT_STARTED:.2f}s after import")
+
+
+if predictor is not None:
+    if WARMUP:
+        warmup_thread = threading.Thread(target=warm_up, name='audify-warmup')
+        warmup_thread.daemon = True
+        warmup_thread.start()
+    else:
+        warmed_up.set()
+
+# Results of repeated uploads are served from a content-addressed cache
+CACHE_DIR = os.environ.get('AUDIFY_CACHE_DIR', 'cache')
+CACHE_MAX_MB = float(os.environ.get('AUDIFY_CACHE_MAX_MB', 1024))
+CACHE_TTL = float(os.environ.get('AUDIFY_CACHE_TTL', 7 * 24 * 3600))
+result_cache = ResultCache(CACHE_DIR, int(CACHE_MAX_MB * 1024 * 1024), CACHE_TTL) if CACHE_MAX_MB > 0 else None
+MODEL_VERSION = getattr(model, 'version', None)
+CACHE_PARAMS = {
+    'mean': mean,
+    'std': std,
+    'quantization': QUANTIZATION,
+    'stream_min_seconds': STREAM_MIN_SECONDS,
+    'lowpass': LOWPASS
+}
+
+# Real-time WebSocket enhancement runs next to the HTTP server. Streams
+# batch among themselves on their own batcher over the same (stateless)
+# model, so a chunk never waits behind an offline job's forward pass.
+STREAM_PORT = int(os.environ.get('AUDIFY_STREAM_PORT', 5001))
+stream_predictor = BatchedPredictor(model, BATCH_FRAMES, BATCH_WAIT_MS) if model is not None else None
+
+
+def start_realtime_server():
+    """Start the WebSocket streaming endpoint if a model is loaded"""
+    if stream_predictor is None:
+        return None
+    return start_stream_server(stream_predictor, mean, std, port=STREAM_PORT, lowpass=LOWPASS)
 
 # Create necessary directories
 os.makedirs('temp', exist_ok=True)
@@ -47,9 +265,52 @@ def health():
     """Health check endpoint"""
     return jsonify({
         "status": "healthy",
-        "model_loaded": model is not None
+        "model_loaded": model is not None,
+        "scheduler": scheduler.stats(),
+        "metrics_scheduler": metrics_scheduler.stats(),
+        "batching": predictor.stats() if predictor is not None else None,
+        "streaming": stream_stats.snapshot(),
+        "stream_batching": stream_predictor.stats() if stream_predictor is not None else None,
+        "cache": result_cache.stats() if result_cache is not None else None
     })
 
+# /metrics exports the shared instrumentation (stage, queue wait and
+# quality metric latencies, audio seconds, job outcomes) along with the
+# state of the worker pools, the result cache and the streaming endpoint
+CallbackMetric('audify_ready', 'Whether the model is loaded and warmed up',
+               lambda: int(warmed_up.is_set()))
+CallbackMetric('audify_jobs_running', 'Jobs being processed', lambda: {
+    (pool.name,): pool.stats()['running'] for pool in (scheduler, metrics_scheduler)}, ('pool',))
+CallbackMetric('audify_jobs_queued', 'Jobs waiting for a worker', lambda: {
+    (pool.name,): pool.stats()['queued'] for pool in (scheduler, metrics_scheduler)}, ('pool',))
+CallbackMetric('audify_metrics_queue_bytes', 'Signals waiting to be scored, held in memory',
+               lambda: QueuedSignals.held_bytes)
+CallbackMetric('audify_stream_connections', 'Open real-time streaming connections',
+               lambda: stream_stats.active)
+if result_cache is not None:
+    CallbackMetric('audify_cache_hits_total', 'Result cache hits',
+                   lambda: result_cache.hits, kind='counter')
+    CallbackMetric('audify_cache_misses_total', 'Result cache misses',
+                   lambda: result_cache.misses, kind='counter')
+    CallbackMetric('audify_cache_evictions_total', 'Result cache entries evicted',
+                   lambda: result_cache.evictions, kind='counter')
+    CallbackMetric('audify_cache_bytes', 'Size of the cached results on disk',
+                   lambda: result_cache.stats()['bytes'])
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Counters and latency histograms in the Prometheus text format"""
+    return Response(instrumentation.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/ready')
+def ready():
+    """Readiness probe: 200 once the model is loaded and warmed up, else 503"""
+    return jsonify({
+        "ready": warmed_up.is_set(),
+        "model_loaded": model is not None,
+        "warmup": warmup_info
+    }), 200 if warmed_up.is_set() else 503
+
 @app.route('/enhance', methods=['POST'])
 def enhance():
     """Start audio enhancement process"""
@@ -63,28 +324,98 @@ def enhance():
     if file.filename == '':
         return jsonify({'success': False, 'error': 'No file selected'}), 400
     
+    metrics_mode = request.form.get('metrics', METRICS)
+    if metrics_mode not in METRICS_MODES:
+        return jsonify({'success': False, 'error': f"metrics must be one of {', '.join(METRICS_MODES)}"}), 400
+    
+    temp_path = None
     try:
         # Generate unique processing ID
         processing_id = str(uuid.uuid4())
         
-        # Save uploaded file
-        filename = secure_filename(file.filename)
-        temp_path = os.path.join('temp', f"{processing_id}_{filename}")
-        file.save(temp_path)
+        # Small uploads are decoded from memory; large ones, and formats
+        # soundfile cannot read (librosa needs a path), go through temp/
+        stream = file.stream
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+        source = None
+        digest = hashlib.sha256()
+        if size <= UPLOAD_MEMORY_BYTES:
+            data = stream.read()
+            try:
+                audio_info(data)
+                source = data
+                digest.update(data)
+            except RuntimeError:
+                stream.seek(0)
+        if source is None:
+            filename = secure_filename(file.filename)
+            temp_path = os.path.join('temp', f"{processing_id}_{filename}")
+            with open(temp_path, 'wb') as f:
+                for chunk in iter(lambda: stream.read(1 << 20), b''):
+                    digest.update(chunk)
+                    f.write(chunk)
+            source = temp_path
+        
+        # Same bytes, model and parameters: reuse the cached result
+        key = None
+        if result_cache is not None:
+            key = cache_key(digest.hexdigest(), MODEL_VERSION, dict(CACHE_PARAMS, metrics=metrics_mode))
+            output_filename = f"enhanced_{processing_id}.wav"
+            entry = result_cache.get(key, os.path.join('/outputs', output_filename))
+            if entry is not None:
+                JOBS.inc(outcome='cached')
+                if temp_path:
+                    os.remove(temp_path)
+                status_store.create(processing_id, {
+                    'status': 'completed',
+                    'progress': 100,
+                    'stage': None,
+                    'stages': {},
+                    'error': None,
+                    'cached': True,
+                    'metrics_status': 'completed' if entry['metrics'] is not None else 'skipped',
+                    'result': {
+                        'success': True,
+                        'output_filename': output_filename,
+                        'metrics': entry['metrics']
+                    }
+                })
+                return jsonify({
+                    'success': True,
+                    'processing_id': processing_id,
+                    'cached': True
+                })
         
         # Initialize processing status
-        with processing_lock:
-            processing_status[processing_id] = {
-                'status': 'processing',
-                'progress': 0,
-                'error': None,
-                'result': None
-            }
+        status_store.create(processing_id, {
+            'status': 'queued',
+            'progress': 0,
+            'stage': None,
+            'stages': {},
+            'error': None,
+            'metrics_status': None,
+            'result': None
+        })
         
-        # Start processing in background thread
-        thread = threading.Thread(target=process_audio, args=(processing_id, temp_path))
-        thread.daemon = True
-        thread.start()
+        # Hand the job to the worker pool, rejecting it if the queue is full
+        try:
+            scheduler.submit(processing_id, process_audio, processing_id, source, key, metrics_mode)
+        except (QueueFullError, SchedulerClosedError) as e:
+            JOBS.inc(outcome='rejected')
+            status_store.delete(processing_id)
+            if temp_path:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+            if isinstance(e, SchedulerClosedError):
+                return jsonify({'success': False, 'error': 'Server is shutting down'}), 503
+            response = jsonify({'success': False, 'error': 'Server busy, please retry later'})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
         
         return jsonify({
             'success': True,
@@ -92,257 +423,242 @@ def enhance():
         })
         
     except Exception as e:
+        if temp_path:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
         return jsonify({'success': False, 'error': str(e)}), 500
 
-def process_audio(processing_id, input_path):
-    """Background processing function"""
+def process_audio(processing_id, source, cache_key=None, metrics_mode=METRICS):
+    """
+    Background processing function; source is the upload's bytes or the
+    path it was spilled to. The job is completed once the output is
+    written; its metrics follow from the metrics pool.
+    """
     try:
+        status_store.update(processing_id, status='processing')
+        
         # Generate output filename
         output_filename = f"enhanced_{processing_id}.wav"
         output_path = os.path.join('/outputs', output_filename)
         
-        # Create output buffer for metrics calculation
-        output_buffer = io.BytesIO()
-        # Enhance audio
-        enhance_func(model, input_path, mean, std, 
-                    output_path=output_path,
-                    output_buffer=output_buffer, update_progress=update_progress,
-                    processing_id=processing_id)
-        # Load original and enhanced audio for metrics
-        original_audio, sr = sf.read(input_path)
-        enhanced_audio, _ = sf.read(output_path)
-        
-        # Calculate quality metrics
-        metrics = calculate_metrics(original_audio, enhanced_audio, sr)
+        # Stream long recordings instead of holding them in memory
+        block_frames = None
+        try:
+            if audio_info(source).duration > STREAM_MIN_SECONDS:
+                block_frames = STREAM_BLOCK_FRAMES
+        except RuntimeError:
+            pass  # Not readable by soundfile, decoded whole by librosa
         
-        with processing_lock:
-            processing_status[processing_id] = {
-                'status': 'completed',
-                'progress': 100,
-                'error': None,
-                'result': {
+        def on_written(y_noisy, enhanced):
+            # Streamed recordings have no in-memory signals to score
+            scored = metrics_mode != 'none' and y_noisy is not None
+            JOBS.inc(outcome='completed')
+            status_store.update(
+                processing_id,
+                status='completed',
+                progress=100,
+                stage=None,
+                error=None,
+                metrics_status='pending' if scored else 'skipped',
+                result={
                     'success': True,
                     'output_filename': output_filename,
-                    'metrics': metrics
+                    'metrics': None
                 }
-            }
+            )
+            if not scored:
+                if cache_key is not None:
+                    result_cache.put(cache_key, output_path, None)
+                return
+            try:
+                signals = QueuedSignals(processing_id, y_noisy, enhanced)
+            except OSError as e:
+                print(f"[metrics] could not queue {processing_id}: {e}")
+                status_store.update(processing_id, metrics_status='skipped')
+                return
+            try:
+                metrics_scheduler.submit(processing_id, score_audio, processing_id, signals,
+                                         metrics_mode, cache_key, output_path)
+            except (QueueFullError, SchedulerClosedError):
+                signals.release()
+                status_store.update(processing_id, metrics_status='skipped')
         
-        # Clean up temp file
-        try:
-            os.remove(input_path)
-        except:
-            pass
+        enhance_func(predictor, source, mean, std,
+                     output_path=output_path,
+                     update_progress=update_progress,
+                     processing_id=processing_id, block_frames=block_frames,
+                     lowpass=LOWPASS, metrics='none', on_written=on_written)
             
     except Exception as e:
-        with processing_lock:
-            processing_status[processing_id] = {
-                'status': 'error',
-                'progress': 0,
-                'error': str(e),
-                'result': None
-            }
-
-def update_progress(processing_id, progress):
-    """Update processing progress"""
-    with processing_lock:
-        if processing_id in processing_status:
-            processing_status[processing_id]['progress'] = progress
-
-
-def segmental_snr(clean, enhanced, frame_len=160, overlap=0.5):
-    """
-    Calculate segmental SNR
-    """
-    try:
-        hop_len = int(frame_len * (1 - overlap))
-        n_frames = (len(clean) - frame_len) // hop_len + 1
-        
-        snr_segments = []
-        for i in range(n_frames):
-            start = i * hop_len
-            end = start + frame_len
-            
-            clean_frame = clean[start:end]
-            enhanced_frame = enhanced[start:end]
-            
-            # Calculate noise as difference
-            noise = clean_frame - enhanced_frame
-            
-            # Calculate power
-            signal_power = np.mean(clean_frame ** 2)
-            noise_power = np.mean(noise ** 2)
-            
-            # Avoid division by zero
-            if noise_power > 1e-10 and signal_power > 1e-10:
-                snr_db = 10 * np.log10(signal_power / noise_power)
-                # Clip extreme values
-                snr_db = np.clip(snr_db, -10, 35)
-                snr_segments.append(snr_db)
-        
-        return np.mean(snr_segments) if snr_segments else 0.0
-    except Exception as e:
-        print(f"Segmental SNR calculation failed: {e}")
-        return 0.0
+        JOBS.inc(outcome='error')
+        status_store.update(
+            processing_id,
+            status='error',
+            progress=0,
+            error=str(e),
+            result=None
+        )
+    finally:
+        # Remove the spilled upload, also when the job failed
+        if isinstance(source, str):
+            try:
+                os.remove(source)
+            except OSError:
+                pass
 
-def compute_pesq_safe(clean, enhanced, sr):
-    """
-    Safely compute PESQ with proper error handling
-    """
+def score_audio(processing_id, signals, level, cache_key=None, output_path=None):
+    """Compute a finished job's metrics on the metrics pool"""
     try:
-        # PESQ only works with 8kHz or 16kHz
-        if sr not in [8000, 16000]:
-            # Resample to 16kHz
-            target_sr = 16000
-            clean_resampled = signal.resample(clean, int(len(clean) * target_sr / sr))
-            enhanced_resampled = signal.resample(enhanced, int(len(enhanced) * target_sr / sr))
-        else:
-            clean_resampled = clean
-            enhanced_resampled = enhanced
-            target_sr = sr
-        
-        # Ensure minimum length (0.25 seconds)
-        min_samples = int(0.25 * target_sr)
-        if len(clean_resampled) < min_samples:
-            return 0.0
-        
-        # Normalize to prevent clipping
-        clean_resampled = clean_resampled / (np.max(np.abs(clean_resampled)) + 1e-10)
-        enhanced_resampled = enhanced_resampled / (np.max(np.abs(enhanced_resampled)) + 1e-10)
-        
-        # PESQ expects reference first, then degraded
-        score = pesq(target_sr, clean_resampled, enhanced_resampled, 'wb')
-        return score
-    except Exception as e:
-        print(f"PESQ calculation failed: {e}")
-        return 0.0
+        job = status_store.get(processing_id)
+        if job is None:
+            return
+        status_store.update(processing_id, metrics_status='running')
+        try:
+            with instrumentation.stage('metrics', lambda name, started, elapsed:
+                                       update_progress(processing_id, 100, name, started, elapsed)):
+                metrics = calculate_metrics(*signals.load(), level=level)
+        except Exception as e:
+            status_store.update(processing_id, metrics_status='error', metrics_error=str(e))
+            return
+    finally:
+        signals.release()
+    job['result']['metrics'] = metrics
+    status_store.update(processing_id, metrics_status='completed', stage=None, result=job['result'])
+    if cache_key is not None:
+        result_cache.put(cache_key, output_path, metrics)
+
+def update_progress(processing_id, progress, stage=None, started=None, elapsed=None):
+    """Update processing progress and record timings of finished stages"""
+    timing = None
+    if stage is not None:
+        timing = {
+            'started_at': started,
+            'duration': elapsed
+        }
+    status_store.update_progress(processing_id, progress, stage, timing)
+
+
+def _settled(job):
+    """Whether a job will not change any more: finished, with its metrics"""
+    return job['status'] in FINISHED_STATES and job.get('metrics_status') not in METRICS_PENDING
+
+def _finished(job):
+    """Whether a job will only change by its metrics arriving"""
+    return job['status'] in FINISHED_STATES
+
+def _status_view(processing_id, job, version):
+    """Add the queue position to a status record and compute its ETag"""
+    position = 0
+    if job['status'] == 'queued':
+        # Only the process that accepted the job knows its queue position
+        position = scheduler.position(processing_id)
+        if position:
+            job['queue_position'] = position
+    return job, f'{version}.{position}'
 
-def compute_stoi_safe(clean, enhanced, sr):
+def _next_status(processing_id, version, etag, deadline, until_finished=False):
     """
-    Safely compute STOI with proper error handling
+    Wait until the job's status no longer matches etag, or until deadline
+    (or, with until_finished, until the job has finished). Returns (job,
+    version, etag); job is None once the job is gone.
     """
-    try:
-        # Normalize signals
-        clean_norm = clean / (np.max(np.abs(clean)) + 1e-10)
-        enhanced_norm = enhanced / (np.max(np.abs(enhanced)) + 1e-10)
-        
-        score = stoi(clean_norm, enhanced_norm, sr, extended=False)
-        return score
-    except Exception as e:
-        print(f"STOI calculation failed: {e}")
-        return 0.0
+    while True:
+        remaining = max(0.0, deadline - time.time())
+        job, version = status_store.wait(processing_id, version, min(remaining, QUEUE_RECHECK_SECONDS))
+        if job is None:
+            return None, version, None
+        job, new_etag = _status_view(processing_id, job, version)
+        if new_etag != etag or time.time() >= deadline or (until_finished and _finished(job)):
+            return job, version, new_etag
 
-def align_signals(reference, test, max_delay=None):
+@app.route('/status/<processing_id>')
+def get_status(processing_id):
     """
-    Align two signals using cross-correlation
+    Get processing status. With ?wait=N and If-None-Match set to the last
+    ETag, the request is held for up to N seconds until the status changes,
+    and answers 304 if it did not. Finished jobs and requests beyond
+    MAX_WAITING are answered at once, with Retry-After telling the client
+    when to poll again.
     """
-    if max_delay is None:
-        max_delay = min(len(reference), len(test)) // 4
-    
-    # Compute cross-correlation
-    correlation = np.correlate(reference, test, mode='full')
-    
-    # Find the delay
-    delay = np.argmax(correlation) - len(test) + 1
-    delay = np.clip(delay, -max_delay, max_delay)
-    
-    # Align signals
-    if delay > 0:
-        # test is delayed
-        aligned_ref = reference[delay:]
-        aligned_test = test[:-delay] if delay < len(test) else test
-    elif delay < 0:
-        # reference is delayed
-        aligned_ref = reference[:delay]
-        aligned_test = test[-delay:]
-    else:
-        aligned_ref = reference
-        aligned_test = test
-    
-    # Ensure same length
-    min_len = min(len(aligned_ref), len(aligned_test))
-    return aligned_ref[:min_len], aligned_test[:min_len]
+    job, version = status_store.wait(processing_id)
+    if job is None:
+        return jsonify({'status': 'not_found'}), 404
+    job, etag = _status_view(processing_id, job, version)
 
-def calculate_metrics(original, enhanced, sr, align_signals_flag=True):
+    wait = min(request.args.get('wait', 0, type=float), LONG_POLL_MAX_SECONDS)
+    retry_after = None
+    if wait > 0 and not _finished(job) and request.if_none_match.contains(etag):
+        if waiting_slots.acquire(blocking=False):
+            try:
+                job, version, etag = _next_status(processing_id, version, etag, time.time() + wait,
+                                                  until_finished=True)
+            finally:
+                waiting_slots.release()
+            if job is None:
+                return jsonify({'status': 'not_found'}), 404
+        else:
+            retry_after = 1
+    if wait > 0 and _finished(job) and not _settled(job):
+        retry_after = METRICS_POLL_SECONDS
+
+    response = jsonify(job)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    if retry_after is not None:
+        response.headers['Retry-After'] = str(retry_after)
+    return response.make_conditional(request)
+
+@app.route('/status/<processing_id>/events')
+def status_events(processing_id):
     """
-    Calculate comprehensive audio quality metrics
+    Stream status changes as Server-Sent Events ("status" events carrying
+    the same JSON as /status). The stream ends once the job has finished,
+    or after AUDIFY_SSE_MAX_SECONDS; EventSource reconnects on its own,
+    every METRICS_POLL_SECONDS while metrics are pending. Beyond
+    MAX_WAITING open streams, new ones are refused with 503.
     """
-    try:
-        # Validate inputs
-        if len(original) == 0 or len(enhanced) == 0:
-            raise ValueError("Empty audio signals")
-        
-        if sr <= 0:
-            raise ValueError("Invalid sample rate")
-        
-        # Convert to numpy arrays
-        original = np.array(original, dtype=np.float32)
-        enhanced = np.array(enhanced, dtype=np.float32)
-        
-        # Align signals if requested
-        if align_signals_flag:
-            original, enhanced = align_signals(original, enhanced)
-        else:
-            # Ensure same length
-            min_len = min(len(original), len(enhanced))
-            original = original[:min_len]
-            enhanced = enhanced[:min_len]
-        
-        # Check minimum length
-        if len(original) < sr * 0.1:  # At least 0.1 seconds
-            warnings.warn("Audio too short for reliable metrics")
-        
-        # Calculate metrics
-        seg_snr = segmental_snr(original, enhanced)
-        pesq_score = compute_pesq_safe(original, enhanced, sr)
-        stoi_score = compute_stoi_safe(original, enhanced, sr)
-        
-        # Calculate SNR (improvement over original)
-        noise = original - enhanced
-        signal_power = np.mean(original ** 2)
-        noise_power = np.mean(noise ** 2)
-        
-        if noise_power > 1e-10:
-            snr = 10 * np.log10(signal_power / noise_power)
-        else:
-            snr = 60.0  # Very high SNR if no noise
-        
-        # Additional metrics
-        signal_length = len(enhanced) / sr
-        signal_rms = np.sqrt(np.mean(enhanced ** 2))
-        
-        # Calculate dynamic range
-        dynamic_range = 20 * np.log10(np.max(np.abs(enhanced)) / (signal_rms + 1e-10))
-        
-        return {
-            'segmental_snr': float(seg_snr),
-            'pesq': float(pesq_score),
-            'stoi': float(stoi_score),
-            'snr': float(snr),
-            'signal_length': float(signal_length),
-            'signal_rms': float(signal_rms),
-            'dynamic_range': float(dynamic_range)
-        }
-        
-    except Exception as e:
-        print(f"[calculate_metrics] failed: {e}")
-        return {
-            'segmental_snr': 0.0,
-            'pesq': 0.0,
-            'stoi': 0.0,
-            'snr': 0.0,
-            'signal_length': 0.0,
-            'signal_rms': 0.0,
-            'dynamic_range': 0.0
-        }
+    job, version = status_store.wait(processing_id)
+    if job is None:
+        return jsonify({'status': 'not_found'}), 404
+    job, etag = _status_view(processing_id, job, version)
+    if not waiting_slots.acquire(blocking=False):
+        response = jsonify({'error': 'Too many status streams, poll /status instead'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
 
-@app.route('/status/<processing_id>')
-def get_status(processing_id):
-    """Get processing status"""
-    with processing_lock:
-        if processing_id in processing_status:
-            return jsonify(processing_status[processing_id])
-        else:
-            return jsonify({'status': 'not_found'}), 404
+    def stream(job, version, etag):
+        deadline = time.time() + SSE_MAX_SECONDS
+        yield 'retry: 1000\n\n'
+        sent = None
+        while True:
+            if etag != sent:
+                yield f'id: {etag}\nevent: status\ndata: {json.dumps(job)}\n\n'
+                sent = etag
+            else:
+                yield ': keepalive\n\n'
+            if _finished(job):
+                if not _settled(job):
+                    yield f'retry: {METRICS_POLL_SECONDS * 1000}\n\n'
+                return
+            if time.time() >= deadline:
+                return
+            job, version, etag = _next_status(
+                processing_id, version, etag,
+                min(deadline, time.time() + SSE_KEEPALIVE_SECONDS))
+            if job is None:
+                yield 'event: status\ndata: {"status": "not_found"}\n\n'
+                return
+
+    response = Response(stream(job, version, etag), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Released when the server closes the response, however the stream ended
+    response.call_on_close(waiting_slots.release)
+    return response
 
 @app.route('/outputs/<filename>')
 def download_file(filename):
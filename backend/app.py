@@ -9,7 +9,8 @@ from flask import Flask, render_template, jsonify
 
 
 # Import the API blueprint from api.py
-from api import app as api_app
+from api import (app as api_app, scheduler, metrics_scheduler, predictor, stream_predictor,
+                 stream_stats, result_cache)
 
 # Create main Flask app
 app = Flask(__name__, 
@@ -19,11 +20,13 @@ app = Flask(__name__,
 
 # Check if model exists on startup
 MODEL_PATH = "backend/models/frame_model.keras"
+WEIGHTS_PATH = "backend/models/frame_model.npz"
 STATS_PATH = "backend/models/norm_stats.json"
 
 def check_model_availability():
-    """Check if trained model exists"""
-    return os.path.exists(MODEL_PATH) and os.path.exists(STATS_PATH)
+    """Check if trained model (Keras or NumPy weights export) exists"""
+    model_exists = os.path.exists(MODEL_PATH) or os.path.exists(WEIGHTS_PATH)
+    return model_exists and os.path.exists(STATS_PATH)
 
 @app.route('/')
 def index():
@@ -38,7 +41,13 @@ def health():
         "status": "healthy",
         "model_loaded": model_available,
         "model_path": MODEL_PATH,
-        "stats_path": STATS_PATH
+        "stats_path": STATS_PATH,
+        "scheduler": scheduler.stats(),
+        "metrics_scheduler": metrics_scheduler.stats(),
+        "batching": predictor.stats() if predictor is not None else None,
+        "streaming": stream_stats.snapshot(),
+        "stream_batching": stream_predictor.stats() if stream_predictor is not None else None,
+        "cache": result_cache.stats() if result_cache is not None else None
     })
 
 # Register API routes from api.py
@@ -54,9 +63,13 @@ def internal_error(error):
 
 # Import API routes
 try:
-    from api import enhance, get_status, download_file
+    from api import enhance, get_status, status_events, download_file, ready, prometheus_metrics, UploadRequest
+    app.request_class = UploadRequest
+    app.add_url_rule('/ready', 'ready', ready, methods=['GET'])
+    app.add_url_rule('/metrics', 'prometheus_metrics', prometheus_metrics, methods=['GET'])
     app.add_url_rule('/enhance', 'enhance', enhance, methods=['POST'])
     app.add_url_rule('/status/<processing_id>', 'get_status', get_status, methods=['GET'])
+    app.add_url_rule('/status/<processing_id>/events', 'status_events', status_events, methods=['GET'])
     app.add_url_rule('/outputs/<filename>', 'download_file', download_file, methods=['GET'])
 except ImportError as e:
     print(f"❌ Failed to import API routes: {e}")
@@ -0,0 +1,229 @@
+"""
+Enhance every audio file under a directory tree.
+
+    python backend/batch.py recordings/ enhanced/ [--workers 4]
+
+Files are spread over a pool of processes that each load the model once.
+The output tree mirrors the input tree (as WAV; files that share a name
+apart from their extension keep it, as in a.flac.wav), and one JSON line
+per file is appended to the manifest with its metrics and stage timings.
+Outputs are written atomically, so an interrupted run resumes by
+skipping the files whose output already exists.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".flac")
+
+# Per-process model, set by init_worker
+_model = None
+_mean = None
+_std = None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads-per-worker", type=int, default=1,
+                        help="BLAS threads per worker process")
+    parser.add_argument("--manifest", default=None,
+                        help="JSONL manifest (default: <output_dir>/manifest.jsonl)")
+    parser.add_argument("--quantization", choices=("int8", "float16"), default=None)
+    parser.add_argument("--stream-min-seconds", type=float, default=300,
+                        help="Stream files longer than this block by block (no metrics)")
+    parser.add_argument("--block-frames", type=int, default=2048)
+    parser.add_argument("--lowpass", choices=("spectral", "time"), default="spectral",
+                        help="Apply the low-pass as a spectral mask or a time-domain filter")
+    parser.add_argument("--metrics", choices=("none", "fast", "full"), default="full",
+                        help="Quality metrics per file (fast leaves out PESQ and STOI)")
+    parser.add_argument("--overwrite", action="store_true",
+                        help="Enhance files again even if their output exists")
+    return parser.parse_args()
+
+
+def find_audio_files(root: str):
+    """Paths of audio files under root, relative to it, in sorted order."""
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                found.append(os.path.relpath(os.path.join(dirpath, name), root))
+    return found
+
+
+def output_names(files: list) -> dict:
+    """
+    Output path of each input, relative to the output directory. Inputs
+    whose paths differ only in their extension (a.wav, a.flac) keep it,
+    so they never write the same output. Raises ValueError if outputs
+    still clash.
+    """
+    stems = Counter(os.path.splitext(rel)[0].lower() for rel in files)
+    names = {}
+    for rel in files:
+        stem = os.path.splitext(rel)[0]
+        names[rel] = (rel if stems[stem.lower()] > 1 else stem) + ".wav"
+    # Compared case-insensitively, as the output may be on such a filesystem
+    counts = Counter(name.lower() for name in names.values())
+    clashes = sorted(rel for rel in files if counts[names[rel].lower()] > 1)
+    if clashes:
+        raise ValueError(f"Inputs map to the same output: {', '.join(clashes)}")
+    return names
+
+
+def init_worker(quantization):
+    """Load the model once per worker process."""
+    global _model, _mean, _std
+    from models.frame_model import load_trained_model
+    _model, _mean, _std = load_trained_model(quantization=quantization)
+    if _model is None:
+        # Breaks the pool, so the remaining files are recorded as failed
+        raise RuntimeError("Trained model not found")
+
+
+def enhance_file(input_path: str, output_path: str, stream_min_seconds: float, block_frames: int,
+                 lowpass: str = "spectral", metrics: str = "full") -> dict:
+    """Enhance one file in a worker, return its manifest record."""
+    import soundfile as sf
+    from models.frame_model import enhance_audio
+
+    record = {"input": input_path, "output": output_path}
+    timings = {}
+
+    def update_progress(_, progress, stage=None, started=None, elapsed=None):
+        if stage is not None:
+            timings[stage] = elapsed
+
+    start = time.perf_counter()
+    # Written under a temporary name so a killed run never leaves a
+    # truncated file that looks finished
+    partial_path = os.path.splitext(output_path)[0] + ".partial.wav"
+    try:
+        stream = None
+        try:
+            info = sf.info(input_path)
+            record["duration"] = info.duration
+            if info.duration > stream_min_seconds:
+                stream = block_frames
+        except RuntimeError:
+            pass  # Not readable by soundfile, decoded whole by librosa
+        scores = enhance_audio(_model, input_path, _mean, _std, output_path=partial_path,
+                               update_progress=update_progress, block_frames=stream,
+                               lowpass=lowpass, metrics=metrics)
+        os.replace(partial_path, output_path)
+        record.update(status="ok", metrics=scores)
+    except Exception as e:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        record.update(status="error", error=str(e) or type(e).__name__)
+    record["timings"] = timings
+    record["elapsed"] = time.perf_counter() - start
+    return record
+
+
+def main():
+    args = parse_args()
+    if not os.path.isdir(args.input_dir):
+        print(f"ERROR: Input directory not found: {args.input_dir}")
+        sys.exit(1)
+    manifest_path = args.manifest or os.path.join(args.output_dir, "manifest.jsonl")
+
+    files = find_audio_files(args.input_dir)
+    try:
+        outputs = {rel: os.path.join(args.output_dir, name) for rel, name in output_names(files).items()}
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    todo = [rel for rel in files if args.overwrite or not os.path.exists(outputs[rel])]
+    print(f"Found {len(files)} audio files, {len(files) - len(todo)} already enhanced")
+    if not todo:
+        return
+
+    from models.frame_model import STATS_PATH
+    if not os.path.exists(STATS_PATH):
+        print(f"ERROR: Trained model not found: {STATS_PATH}")
+        sys.exit(1)
+
+    # Workers are spawned rather than forked so each starts its BLAS
+    # thread pool with the limit below instead of inheriting the parent's
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(args.threads_per_worker)
+    workers = max(1, min(args.workers, len(todo)))
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+
+    done, failed = 0, 0
+    start = time.perf_counter()
+    pending = iter(todo)
+    running = {}
+
+    def write_record(rel, record):
+        nonlocal done, failed
+        record["file"] = rel
+        manifest.write(json.dumps(record, default=float) + "\n")
+        manifest.flush()
+        done += 1
+        if record["status"] != "ok":
+            failed += 1
+            print(f"[{done}/{len(todo)}] {rel}: ERROR {record['error']}")
+        else:
+            print(f"[{done}/{len(todo)}] {rel}: {record['elapsed']:.2f}s")
+
+    with open(manifest_path, "a") as manifest, ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker, initargs=(args.quantization,)) as pool:
+        broken = None
+        while True:
+            # Keep a few files per worker in flight, not the whole tree
+            while broken is None and len(running) < 2 * workers:
+                rel = next(pending, None)
+                if rel is None:
+                    break
+                try:
+                    future = pool.submit(enhance_file, os.path.join(args.input_dir, rel), outputs[rel],
+                                         args.stream_min_seconds, args.block_frames, args.lowpass,
+                                         args.metrics)
+                except BrokenProcessPool as e:
+                    broken = str(e)
+                    pending = iter([rel] + list(pending))
+                    break
+                running[future] = rel
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                rel = running.pop(future)
+                try:
+                    record = future.result()
+                except Exception as e:  # Worker died, or failed to load the model
+                    if isinstance(e, BrokenProcessPool):
+                        broken = str(e)
+                    record = {"input": os.path.join(args.input_dir, rel), "status": "error", "error": str(e)}
+                write_record(rel, record)
+
+        # A broken pool runs nothing more: record the files it never started
+        if broken is not None:
+            for rel in pending:
+                write_record(rel, {"input": os.path.join(args.input_dir, rel), "status": "error",
+                                   "error": f"Not started: {broken}"})
+
+    elapsed = time.perf_counter() - start
+    print(f"Enhanced {done - failed} files in {elapsed:.1f}s ({failed} failed)")
+    print(f"Manifest: {manifest_path}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Content-addressed cache of enhancement results.
+Entries are keyed by the SHA-256 of the uploaded bytes together with the
+model version and processing parameters, and hold the enhanced WAV plus
+its metrics. Size is bounded on disk (least recently used entries go
+first) and entries expire after a TTL.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+
+def cache_key(data_hash: str, model_version: str, params: dict) -> str:
+    """Key of a result: upload hash + model version + parameters."""
+    payload = json.dumps({"data": data_hash, "model": model_version, "params": params}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Disk-backed LRU cache of enhanced WAVs and their metrics.
+
+    Sizes, access and creation times are kept in an in-memory index, built
+    once from the directory at startup, so lookups, stats and eviction do
+    not scan the disk; entries stored by other processes sharing the
+    directory are indexed when first looked up. Files left half-written by
+    a failed put are removed when it fails and at startup.
+    """
+
+    def __init__(self, root: str = "cache", max_bytes: int = 1 << 30, ttl: float = 7 * 24 * 3600):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> {"size", "last_used", "created"}, and their total size
+        self._index = {}
+        self._bytes = 0
+        os.makedirs(root, exist_ok=True)
+        with self._lock:
+            self._load_index()
+            self._evict()
+
+    def _paths(self, key: str):
+        return os.path.join(self.root, key + ".wav"), os.path.join(self.root, key + ".json")
+
+    def _load_index(self):
+        """Index complete entries on disk and remove everything else."""
+        names = set(os.listdir(self.root))
+        for name in names:
+            key, ext = os.path.splitext(name)
+            if ext == ".json" and key + ".wav" in names:
+                wav_path, meta_path = self._paths(key)
+                try:
+                    with open(meta_path) as f:
+                        created = json.load(f)["created"]
+                    self._add(key, os.path.getsize(wav_path), os.path.getmtime(meta_path), created)
+                    continue
+                except (OSError, ValueError, KeyError):
+                    pass
+            elif ext == ".wav" and key + ".json" in names:
+                continue
+            # Orphaned WAV or metadata, or a leftover .tmp file
+            try:
+                os.remove(os.path.join(self.root, name))
+            except OSError:
+                pass
+
+    def _add(self, key: str, size: int, last_used: float, created: float):
+        self._forget(key)
+        self._index[key] = {"size": size, "last_used": last_used, "created": created}
+        self._bytes += size
+
+    def _forget(self, key: str):
+        entry = self._index.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry["size"]
+
+    def get(self, key: str, dest_path: str):
+        """
+        Copy a cached WAV to dest_path and return its entry
+        ({"created": ..., "metrics": ...}), or None on a miss.
+        """
+        wav_path, meta_path = self._paths(key)
+        with self._lock:
+            entry = self._index.get(key)
+            try:
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                if time.time() - meta["created"] > self.ttl:
+                    raise FileNotFoundError(key)
+                _link_or_copy(wav_path, dest_path)
+                # Access time for LRU eviction, also kept on disk for restarts
+                now = time.time()
+                os.utime(meta_path, (now, now))
+                if entry is None:
+                    # Stored by another server process sharing the directory
+                    self._add(key, os.path.getsize(wav_path), now, meta["created"])
+                else:
+                    entry["last_used"] = now
+            except (OSError, ValueError, KeyError):
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return meta
+
+    def put(self, key: str, wav_path: str, metrics: dict):
+        """Store a finished result and evict entries over the limits."""
+        cached_wav, meta_path = self._paths(key)
+        with self._lock:
+            try:
+                tmp_path = cached_wav + ".tmp"
+                shutil.copyfile(wav_path, tmp_path)
+                os.replace(tmp_path, cached_wav)
+                created = time.time()
+                with open(meta_path + ".tmp", "w") as f:
+                    json.dump({"created": created, "metrics": metrics}, f)
+                os.replace(meta_path + ".tmp", meta_path)
+                self._add(key, os.path.getsize(cached_wav), created, created)
+            except OSError as e:
+                print(f"[cache] failed to store {key}: {e}")
+                self._remove(key)
+                return
+            self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._index),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes
+            }
+
+    def _remove(self, key: str):
+        self._forget(key)
+        wav_path, meta_path = self._paths(key)
+        for path in (wav_path, meta_path, wav_path + ".tmp", meta_path + ".tmp"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _evict(self):
+        """Drop expired entries, then least recently used ones over max_bytes."""
+        now = time.time()
+        for key in [key for key, entry in self._index.items() if now - entry["created"] > self.ttl]:
+            self._remove(key)
+            self.evictions += 1
+        if self._bytes <= self.max_bytes:
+            return
+        for key in sorted(self._index, key=lambda k: self._index[k]["last_used"]):
+            if self._bytes <= self.max_bytes:
+                break
+            self._remove(key)
+            self.evictions += 1
+
+
+def _link_or_copy(src: str, dest: str):
+    """Hard-link src to dest when possible, else copy it."""
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
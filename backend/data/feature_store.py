@@ -0,0 +1,280 @@
+"""
+Precomputed training features.
+
+The dB spectrogram frames of every clean/noisy pair are stored as one
+shard of two float32 .npy files (noisy and clean, trimmed to the same
+number of frames) that training memory-maps. An index records the
+mtime, size and SHA-256 of both sources, so rebuilding only extracts
+pairs that were added or changed, and per-shard running statistics so
+the normalization stats never need another pass over the frames.
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from data.features import extract_features, SR, N_FFT, HOP_LENGTH, WINDOW_TYPE
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".flac")
+INDEX_NAME = "index.json"
+# Shards whose frames are mixed together when shuffling
+SHUFFLE_SHARDS = 8
+
+# Feature settings the shards were computed with; changing any of them
+# invalidates the store
+FEATURE_PARAMS = {"sr": SR, "n_fft": N_FFT, "hop_length": HOP_LENGTH, "window": WINDOW_TYPE}
+
+
+class RunningStats:
+    """
+    Streaming mean and variance: Welford's algorithm, with Chan et al.'s
+    update to fold in whole blocks (or other RunningStats) at once.
+    """
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def update(self, x: np.ndarray):
+        x = np.asarray(x, dtype=np.float64).ravel()
+        if x.size:
+            mean = x.mean()
+            centered = x - mean
+            self.merge(RunningStats(x.size, float(mean), float(np.dot(centered, centered))))
+        return self
+
+    def merge(self, other: "RunningStats"):
+        count = self.count + other.count
+        if other.count:
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / count
+            self.m2 += other.m2 + delta * delta * self.count * other.count / count
+            self.count = count
+        return self
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.m2 / self.count)) if self.count else 0.0
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _source_info(path: str, with_hash: bool = True) -> dict:
+    stat = os.stat(path)
+    info = {"mtime": stat.st_mtime, "size": stat.st_size}
+    if with_hash:
+        info["sha256"] = file_sha256(path)
+    return info
+
+
+def _unchanged(info: dict, previous: dict) -> bool:
+    return previous is not None and info["mtime"] == previous["mtime"] and info["size"] == previous["size"]
+
+
+def _save_npy(path: str, array: np.ndarray):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _shard_intact(shard_prefix: str, entry: dict) -> bool:
+    """Whether both shard files exist with the shape recorded in entry."""
+    for suffix in (".noisy.npy", ".clean.npy"):
+        try:
+            shape = np.load(shard_prefix + suffix, mmap_mode="r").shape
+        except (OSError, ValueError):
+            return False
+        if shape != (entry["frames"], entry["bins"]):
+            return False
+    return True
+
+
+def _build_shard(clean_file: str, noisy_file: str, shard_prefix: str, previous: dict = None):
+    """
+    Extract one pair into <shard_prefix>.noisy.npy / .clean.npy. Returns
+    its index entry and whether it was extracted: if the sources have the
+    same content as in previous and its shard is intact, only their
+    recorded mtimes are refreshed.
+    """
+    clean_info = _source_info(clean_file)
+    noisy_info = _source_info(noisy_file)
+    if (previous is not None
+            and _shard_intact(shard_prefix, previous)
+            and previous["clean"]["sha256"] == clean_info["sha256"]
+            and previous["noisy"]["sha256"] == noisy_info["sha256"]):
+        return dict(previous, clean=clean_info, noisy=noisy_info), False
+
+    clean_feats, _, _ = extract_features(clean_file)
+    noisy_feats, _, _ = extract_features(noisy_file)
+    frames = min(clean_feats.shape[0], noisy_feats.shape[0])
+    noisy_feats = np.ascontiguousarray(noisy_feats[:frames], dtype=np.float32)
+    clean_feats = np.ascontiguousarray(clean_feats[:frames], dtype=np.float32)
+    _save_npy(shard_prefix + ".noisy.npy", noisy_feats)
+    _save_npy(shard_prefix + ".clean.npy", clean_feats)
+
+    stats = RunningStats().update(noisy_feats)
+    return {
+        "shard": os.path.basename(shard_prefix),
+        "frames": int(frames),
+        "bins": int(noisy_feats.shape[1]),
+        "mean": stats.mean,
+        "m2": stats.m2,
+        "clean": clean_info,
+        "noisy": noisy_info
+    }, True
+
+
+class FeatureStore:
+    """
+    Sharded, memory-mapped dB frames of a clean/noisy dataset.
+    """
+
+    def __init__(self, root: str = "features"):
+        self.root = root
+        self.index_path = os.path.join(root, INDEX_NAME)
+        self.entries = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                index = json.load(f)
+            if index.get("params") == FEATURE_PARAMS:
+                self.entries = index["files"]
+
+    def _shard_prefix(self, name: str) -> str:
+        key = hashlib.sha1(name.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.root, key)
+
+    def build(self, clean_path: str, noisy_path: str, workers: int = None) -> dict:
+        """
+        Bring the store up to date with the clean/noisy directories.
+        Pairs whose sources kept their mtime and size and whose shard is
+        intact are skipped without reading them; the rest are hashed and
+        re-extracted (in parallel) if their content changed or their
+        shard is missing or truncated. Returns counts of what was done.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        names = sorted(f for f in os.listdir(clean_path)
+                       if f.lower().endswith(AUDIO_EXTENSIONS)
+                       and os.path.exists(os.path.join(noisy_path, f)))
+
+        todo = []
+        for name in names:
+            previous = self.entries.get(name)
+            clean_file = os.path.join(clean_path, name)
+            noisy_file = os.path.join(noisy_path, name)
+            if (previous is not None
+                    and _unchanged(_source_info(clean_file, with_hash=False), previous["clean"])
+                    and _unchanged(_source_info(noisy_file, with_hash=False), previous["noisy"])
+                    and _shard_intact(self._shard_prefix(name), previous)):
+                continue
+            todo.append((name, clean_file, noisy_file, previous))
+
+        removed = [name for name in self.entries if name not in set(names)]
+        for name in removed:
+            del self.entries[name]
+            for suffix in (".noisy.npy", ".clean.npy"):
+                try:
+                    os.remove(self._shard_prefix(name) + suffix)
+                except OSError:
+                    pass
+
+        extracted = 0
+        if todo:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [(name, pool.submit(_build_shard, clean_file, noisy_file,
+                                              self._shard_prefix(name), previous))
+                           for name, clean_file, noisy_file, previous in todo]
+                for name, future in futures:
+                    self.entries[name], was_extracted = future.result()
+                    extracted += was_extracted
+        self._write_index()
+        return {"files": len(names), "extracted": extracted,
+                "unchanged": len(names) - extracted, "removed": len(removed)}
+
+    def _write_index(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"params": FEATURE_PARAMS, "files": self.entries}, f)
+        os.replace(tmp_path, self.index_path)
+
+    def split(self, fraction: float):
+        """
+        Split pair names into (train, validation) with about fraction of
+        them held out. The split depends only on each name, so it stays
+        the same across runs and as pairs are added.
+        """
+        names = sorted(self.entries)
+        if fraction <= 0 or len(names) < 2:
+            return names, []
+        rank = {name: int(hashlib.sha1(name.encode("utf-8")).hexdigest()[:8], 16) / 2 ** 32
+                for name in names}
+        held_out = [name for name in names if rank[name] < fraction]
+        if not held_out:
+            held_out = [min(names, key=rank.get)]
+        if len(held_out) == len(names):
+            held_out.remove(max(held_out, key=rank.get))
+        return [name for name in names if name not in held_out], held_out
+
+    def count_frames(self, names: list = None) -> int:
+        names = self.entries if names is None else names
+        return sum(self.entries[name]["frames"] for name in names)
+
+    @property
+    def n_bins(self) -> int:
+        return next(iter(self.entries.values()))["bins"]
+
+    def stats(self, names: list = None):
+        """
+        Mean and standard deviation over the noisy frames of the given
+        pairs (all by default), merged from the per-shard running statistics.
+        """
+        total = RunningStats()
+        for name in (self.entries if names is None else names):
+            entry = self.entries[name]
+            total.merge(RunningStats(entry["frames"] * entry["bins"], entry["mean"], entry["m2"]))
+        return float(total.mean), total.std
+
+    def open(self, name: str):
+        """Memory-mapped (noisy, clean) frames of one pair."""
+        prefix = self._shard_prefix(name)
+        return (np.load(prefix + ".noisy.npy", mmap_mode="r"),
+                np.load(prefix + ".clean.npy", mmap_mode="r"))
+
+    def batches(self, batch_size: int, mean: float, std: float,
+                shuffle: bool = True, seed: int = None, names: list = None):
+        """
+        Yield one epoch of normalized (X, Y) float32 batches over the given
+        pairs (all by default), ceil(frames / batch_size) of them. When
+        shuffling, shard order is shuffled and frames are mixed across
+        groups of SHUFFLE_SHARDS shards, so only that many shards are in
+        memory at once.
+        """
+        rng = np.random.default_rng(seed)
+        names = sorted(self.entries if names is None else names)
+        order = rng.permutation(len(names)) if shuffle else np.arange(len(names))
+        group = SHUFFLE_SHARDS if shuffle else 1
+        # Frames left over from the previous group, fewer than a batch
+        carry_x = np.empty((0, self.n_bins), dtype=np.float32)
+        carry_y = carry_x
+        for start in range(0, len(order), group):
+            pairs = [self.open(names[i]) for i in order[start:start + group]]
+            X = np.concatenate([carry_x] + [x for x, _ in pairs])
+            Y = np.concatenate([carry_y] + [y for _, y in pairs])
+            if shuffle:
+                perm = rng.permutation(len(X))
+                X, Y = X[perm], Y[perm]
+            full = len(X) - len(X) % batch_size
+            for i in range(0, full, batch_size):
+                yield (X[i:i + batch_size] - mean) / std, (Y[i:i + batch_size] - mean) / std
+            carry_x, carry_y = X[full:], Y[full:]
+        if len(carry_x):
+            yield (carry_x - mean) / std, (carry_y - mean) / std
@@ -1,6 +1,14 @@
+import functools
+import io
+import os
+import tempfile
+
 import numpy as np
-import librosa
-from scipy.signal import butter, lfilter
+import soundfile as sf
+import scipy.fft
+
+# librosa and scipy.signal are slow to import, so they are imported in
+# the functions that need them
 
 # Audio constants
 SR = 16000
@@ -8,15 +16,330 @@ N_FFT = 512
 HOP_LENGTH = 128
 WINDOW_TYPE = 'hann'
 
+# Analysis/synthesis window (periodic Hann, as scipy.signal.get_window
+# gives it) and its square for overlap-add normalization, computed once
+# for the fixed settings above
+WINDOW = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(N_FFT) / N_FFT)).astype(np.float32)
+WINDOW_SQ = WINDOW ** 2
 
-def butter_lowpass_filter(data: np.ndarray, cutoff: float, sr: int = SR, order: int = 6) -> np.ndarray:
+
+def frame_signal(x: np.ndarray, frame_len: int, hop: int) -> np.ndarray:
     """
-    Apply a low-pass Butterworth filter to the audio data.
+    Split the last axis of x into frames of frame_len samples every hop
+    samples, as a read-only strided view of shape (..., frames, frame_len).
+    Trailing samples that do not fill a frame are dropped.
+    """
+    x = np.asarray(x)
+    if x.shape[-1] < frame_len:
+        return np.zeros(x.shape[:-1] + (0, frame_len), dtype=x.dtype)
+    return np.lib.stride_tricks.sliding_window_view(x, frame_len, axis=-1)[..., ::hop, :]
+
+
+# Spectral engine for the fixed N_FFT / HOP_LENGTH / Hann settings. These
+# match librosa.stft, istft, amplitude_to_db and db_to_amplitude with the
+# module settings, but skip their per-call validation and window setup and
+# stay in float32/complex64 (scipy.fft keeps single precision, numpy<2 does
+# not).
+
+def stft(y: np.ndarray) -> np.ndarray:
+    """
+    Centered, zero-padded STFT of a waveform, complex64 (freq_bins, frames).
+    """
+    y = np.asarray(y, dtype=np.float32)
+    padded = np.zeros(len(y) + 2 * (N_FFT // 2), dtype=np.float32)
+    padded[N_FFT // 2:N_FFT // 2 + len(y)] = y
+    frames = frame_signal(padded, N_FFT, HOP_LENGTH) * WINDOW
+    return scipy.fft.rfft(frames, axis=-1).T
+
+
+def _overlap_add(frames: np.ndarray, out: np.ndarray, norm: np.ndarray = None):
+    """
+    Add windowed frames (frames, N_FFT) into out every HOP_LENGTH samples,
+    one hop-sized segment of every frame at a time; also accumulate the
+    squared window into norm when given.
+    """
+    n_frames = len(frames)
+    out_hops = out.reshape(-1, HOP_LENGTH)
+    norm_hops = norm.reshape(-1, HOP_LENGTH) if norm is not None else None
+    for seg in range(N_FFT // HOP_LENGTH):
+        part = slice(seg * HOP_LENGTH, (seg + 1) * HOP_LENGTH)
+        out_hops[seg:seg + n_frames] += frames[:, part]
+        if norm is not None:
+            norm_hops[seg:seg + n_frames] += WINDOW_SQ[part]
+
+
+def istft(stft_matrix: np.ndarray, length: int = None) -> np.ndarray:
+    """
+    Inverse of stft by windowed overlap-add, float32. Like librosa.istft
+    the output is trimmed (or zero padded) to length when it is given.
     """
+    n_frames = stft_matrix.shape[1]
+    if n_frames == 0:
+        return np.zeros(length or 0, dtype=np.float32)
+    frames = scipy.fft.irfft(stft_matrix.T.astype(np.complex64, copy=False), n=N_FFT, axis=-1)
+    frames *= WINDOW
+    full = N_FFT + HOP_LENGTH * (n_frames - 1)
+    out = np.zeros(full, dtype=np.float32)
+    norm = np.zeros(full, dtype=np.float32)
+    _overlap_add(frames, out, norm)
+    nonzero = norm > np.finfo(np.float32).tiny
+    out[nonzero] /= norm[nonzero]
+    out = out[N_FFT // 2:]
+    if length is None:
+        return out[:full - 2 * (N_FFT // 2)]
+    if length > len(out):
+        return np.concatenate([out, np.zeros(length - len(out), dtype=np.float32)])
+    return out[:length]
+
+
+def amplitude_to_db(magnitude: np.ndarray, top_db: float = 80.0) -> np.ndarray:
+    """
+    20 * log10(magnitude) with a 1e-5 floor and, unless top_db is None,
+    clipped to top_db below the peak. float32.
+    """
+    power = np.square(np.abs(magnitude).astype(np.float32, copy=False))
+    np.maximum(power, np.float32(1e-10), out=power)
+    db = np.log10(power, out=power)
+    db *= np.float32(10.0)
+    if top_db is not None and db.size:
+        np.maximum(db, db.max() - np.float32(top_db), out=db)
+    return db
+
+
+def phase_vector(stft_matrix: np.ndarray) -> np.ndarray:
+    """
+    Unit-magnitude phase factors of an STFT, exp(1j * angle) computed by
+    dividing by the magnitude (1 where it is zero), complex64.
+    """
+    stft_matrix = np.asarray(stft_matrix, dtype=np.complex64)
+    mag = np.abs(stft_matrix)
+    silent = mag == 0
+    mag[silent] = 1
+    phase = stft_matrix / mag
+    phase[silent] = 1
+    return phase
+
+
+def db_to_amplitude(db: np.ndarray) -> np.ndarray:
+    """Inverse of amplitude_to_db (without the clipping), float32."""
+    return np.exp(np.asarray(db, dtype=np.float32) * np.float32(np.log(10.0) / 20.0))
+
+
+@functools.lru_cache(maxsize=None)
+def butter_lowpass(cutoff: float, sr: int = SR, order: int = 6) -> np.ndarray:
+    """
+    Design a low-pass Butterworth filter as second-order sections.
+    Designs are cached per (cutoff, sr, order) and shared, so callers
+    must not modify them.
+    """
+    from scipy.signal import butter
+
     nyquist = 0.5 * sr
     normal_cutoff = cutoff / nyquist
-    b, a = butter(order, normal_cutoff, btype='low', analog=False)
-    return lfilter(b, a, data)
+    return butter(order, normal_cutoff, btype='low', analog=False, output='sos')
+
+
+@functools.lru_cache(maxsize=None)
+def lowpass_mask(cutoff: float, sr: int = SR, order: int = 6) -> np.ndarray:
+    """
+    Magnitude response of butter_lowpass at the STFT bin frequencies,
+    float32 (freq_bins, 1), to multiply spectrogram magnitudes with.
+    Applied this way the filter has zero phase.
+    """
+    from scipy.signal import sosfreqz
+
+    _, response = sosfreqz(butter_lowpass(cutoff, sr, order),
+                           worN=np.fft.rfftfreq(N_FFT, 1.0 / sr), fs=sr)
+    mask = np.abs(response).astype(np.float32)[:, None]
+    mask.setflags(write=False)
+    return mask
+
+
+def butter_lowpass_filter(data: np.ndarray, cutoff: float, sr: int = SR, order: int = 6) -> np.ndarray:
+    """
+    Apply a low-pass Butterworth filter to the audio data.
+    """
+    from scipy.signal import sosfilt
+
+    return sosfilt(butter_lowpass(cutoff, sr, order), data)
+
+
+class StreamingLowpass:
+    """
+    butter_lowpass_filter applied block by block, carrying the filter
+    state so the output matches filtering the whole signal at once.
+    """
+
+    def __init__(self, cutoff: float, sr: int = SR, order: int = 6):
+        self.sos = butter_lowpass(cutoff, sr, order)
+        self.zi = np.zeros((self.sos.shape[0], 2))
+
+    def process(self, data: np.ndarray) -> np.ndarray:
+        if len(data) == 0:
+            return data
+        from scipy.signal import sosfilt
+
+        out, self.zi = sosfilt(self.sos, data, zi=self.zi)
+        return out
+
+
+class StreamingSTFT:
+    """
+    Incremental STFT giving the same frames as librosa.stft with the
+    module settings (centered, zero padded), fed one block at a time.
+    """
+
+    def __init__(self):
+        # Centering pads the start of the signal with N_FFT // 2 zeros
+        self._buffer = np.zeros(N_FFT // 2, dtype=np.float32)
+
+    def _frames(self) -> np.ndarray:
+        n_frames = 0 if len(self._buffer) < N_FFT else 1 + (len(self._buffer) - N_FFT) // HOP_LENGTH
+        if n_frames == 0:
+            return np.zeros((N_FFT // 2 + 1, 0), dtype=np.complex64)
+        frames = frame_signal(self._buffer, N_FFT, HOP_LENGTH)[:n_frames] * WINDOW
+        self._buffer = self._buffer[n_frames * HOP_LENGTH:]
+        return scipy.fft.rfft(frames, axis=-1).T
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Add samples, return the complex frames (freq_bins, frames) now complete."""
+        self._buffer = np.concatenate([self._buffer, np.asarray(samples, dtype=np.float32)])
+        return self._frames()
+
+    def flush(self) -> np.ndarray:
+        """Pad the end of the signal and return the remaining frames."""
+        self._buffer = np.concatenate([self._buffer, np.zeros(N_FFT // 2, dtype=np.float32)])
+        return self._frames()
+
+
+class StreamingISTFT:
+    """
+    Incremental overlap-add inverse of StreamingSTFT, matching
+    librosa.istft on the concatenated frames. Samples are released as
+    soon as no later frame can overlap them.
+    """
+
+    def __init__(self):
+        assert N_FFT % HOP_LENGTH == 0
+        self._overlap = np.zeros(N_FFT - HOP_LENGTH, dtype=np.float32)
+        self._overlap_norm = np.zeros(N_FFT - HOP_LENGTH, dtype=np.float32)
+        # Centering added N_FFT // 2 samples that are dropped from the output
+        self._trim = N_FFT // 2
+
+    def _release(self, out: np.ndarray, norm: np.ndarray) -> np.ndarray:
+        nonzero = norm > np.finfo(norm.dtype).tiny
+        out[nonzero] /= norm[nonzero]
+        if self._trim:
+            dropped = min(self._trim, len(out))
+            out = out[dropped:]
+            self._trim -= dropped
+        return out
+
+    def process(self, stft: np.ndarray) -> np.ndarray:
+        """Add complex frames (freq_bins, frames), return the finished samples."""
+        n_frames = stft.shape[1]
+        if n_frames == 0:
+            return np.zeros(0, dtype=np.float32)
+        frames = scipy.fft.irfft(stft.T.astype(np.complex64, copy=False), n=N_FFT, axis=-1)
+        frames *= WINDOW
+        length = N_FFT + HOP_LENGTH * (n_frames - 1)
+        out = np.zeros(length, dtype=np.float32)
+        norm = np.zeros(length, dtype=np.float32)
+        out[:len(self._overlap)] = self._overlap
+        norm[:len(self._overlap_norm)] = self._overlap_norm
+        _overlap_add(frames, out, norm)
+        done = n_frames * HOP_LENGTH
+        self._overlap = out[done:].copy()
+        self._overlap_norm = norm[done:].copy()
+        return self._release(out[:done], norm[:done])
+
+    def flush(self) -> np.ndarray:
+        """Return the tail, trimmed like a centered librosa.istft."""
+        tail = len(self._overlap) - N_FFT // 2
+        out = self._release(self._overlap[:tail].copy(), self._overlap_norm[:tail])
+        self._overlap = self._overlap[:0]
+        self._overlap_norm = self._overlap_norm[:0]
+        return out
+
+
+def _open_source(source):
+    """A path as is, or a fresh file object over in-memory audio bytes."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    return source
+
+
+def audio_info(source):
+    """soundfile info of an audio file path or in-memory bytes."""
+    return sf.info(_open_source(source))
+
+
+def resample(y: np.ndarray, orig_sr: int, sr: int = SR) -> np.ndarray:
+    """
+    Resample a float32 waveform with soxr's polyphase HQ resampler, the
+    one librosa.load uses by default, so features match it.
+    """
+    if orig_sr == sr:
+        return y
+    import soxr
+    return soxr.resample(y, orig_sr, sr, quality='HQ')
+
+
+def stream_audio(file_path, block_size: int, sr: int = SR):
+    """
+    Decode an audio file (path or in-memory bytes) block by block as a
+    mono float32 waveform at the given sample rate, like load_audio but
+    in bounded memory.
+    """
+    info = audio_info(file_path)
+    resampler = None
+    if info.samplerate != sr:
+        import soxr
+        resampler = soxr.ResampleStream(info.samplerate, sr, 1, dtype='float32')
+    for block in sf.blocks(_open_source(file_path), blocksize=block_size, dtype='float32', always_2d=True):
+        y = block.mean(axis=1)
+        if resampler is not None:
+            y = resampler.resample_chunk(y)
+        yield y
+    if resampler is not None:
+        yield resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+
+
+def load_audio(file_path, sr: int = SR) -> np.ndarray:
+    """
+    Decode an audio file (path or in-memory bytes) to a mono float32
+    waveform at the given sample rate. soundfile decodes it directly;
+    formats it cannot read go through librosa, via a temporary file for
+    in-memory data.
+    """
+    try:
+        y, orig_sr = sf.read(_open_source(file_path), dtype='float32', always_2d=True)
+    except RuntimeError:
+        import librosa
+
+        if not isinstance(file_path, (bytes, bytearray, memoryview)):
+            return librosa.load(file_path, sr=sr)[0]
+        fd, temp_path = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(file_path)
+            return librosa.load(temp_path, sr=sr)[0]
+        finally:
+            os.remove(temp_path)
+    return resample(y.mean(axis=1), orig_sr, sr)
+
+
+def compute_features(y: np.ndarray):
+    """
+    Compute the magnitude spectrogram in dB of a waveform.
+
+    Returns:
+        db_feats (np.ndarray): Array of shape (frames, freq_bins) in dB.
+        stft (np.ndarray): Complex STFT matrix (freq_bins, frames).
+    """
+    stft_matrix = stft(y)
+    db = amplitude_to_db(stft_matrix)
+    return db.T, stft_matrix
 
 
 def extract_features(file_path: str, sr: int = SR):
@@ -28,8 +351,6 @@ def extract_features(file_path: str, sr: int = SR):
         waveform (np.ndarray): Raw audio signal.
         stft (np.ndarray): Complex STFT matrix (freq_bins, frames).
     """
-    y, _ = librosa.load(file_path, sr=sr)
-    stft = librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH, window=WINDOW_TYPE)
-    mag = np.abs(stft)
-    db = librosa.amplitude_to_db(mag)
-    return db.T, y, stft
\ No newline at end of file
+    y = load_audio(file_path, sr=sr)
+    db, stft = compute_features(y)
+    return db, y, stft
\ No newline at end of file
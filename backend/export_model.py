@@ -0,0 +1,36 @@
+"""
+Export the trained Keras frame model to NumPy weights for serving.
+Checks that the NumPy engine reproduces the Keras outputs.
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from models.frame_model import MODEL_PATH, WEIGHTS_PATH, export_trained_model
+from models.numpy_model import NumpyFrameModel
+
+TOLERANCE = 1e-3
+
+if __name__ == "__main__":
+    if not os.path.exists(MODEL_PATH):
+        print(f"ERROR: Trained model not found: {MODEL_PATH}")
+        print("Please run 'python backend/train.py' first.")
+        sys.exit(1)
+
+    keras_model = export_trained_model()
+    numpy_model = NumpyFrameModel.load(WEIGHTS_PATH)
+
+    frames = np.random.default_rng(0).standard_normal((2048, numpy_model.input_dim)).astype(np.float32)
+    expected = keras_model.predict(frames, verbose=0)
+    actual = numpy_model.predict(frames)
+    max_diff = float(np.max(np.abs(expected - actual)))
+
+    print(f"Weights exported to: {WEIGHTS_PATH} ({os.path.getsize(WEIGHTS_PATH) / 1e6:.1f} MB)")
+    print(f"Max abs difference vs Keras: {max_diff:.2e}")
+    if max_diff > TOLERANCE:
+        print(f"❌ NumPy engine differs from Keras by more than {TOLERANCE}")
+        sys.exit(1)
+    print("✅ NumPy engine matches Keras")
@@ -0,0 +1,249 @@
+"""
+Process-wide counters and latency histograms for Audify, rendered in the
+Prometheus text exposition format by /metrics.
+
+Recording a value takes a lock, a dict lookup and a bisect over the
+bucket bounds (a few microseconds), so the timers stay on in production.
+Values that other objects already track (queue lengths, cache counters)
+are read through callbacks when the metrics are rendered. Work that is
+not real traffic, such as the startup warm-up, runs under unrecorded().
+"""
+import abc
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Every metric created, in creation order
+REGISTRY = []
+
+# Per-thread flag set by unrecorded()
+_local = threading.local()
+
+
+def _format_value(value) -> str:
+    if isinstance(value, int):
+        return str(value)
+    value = float(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class _Metric(abc.ABC):
+    kind = None
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    @abc.abstractmethod
+    def samples(self):
+        """(name, labels, value) of every series, for rendering."""
+
+
+class Counter(_Metric):
+    """Monotonic total, per label set."""
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        if getattr(_local, "paused", False):
+            return
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in values.items():
+            yield self.name, dict(zip(self.labels, key)), value
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observed values, per label set."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        if getattr(_local, "paused", False):
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket (not cumulative) counts, +Inf last; sum; count
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def totals(self, **labels):
+        """(count, sum) of the observations with these labels."""
+        with self._lock:
+            series = self._values.get(self._key(labels))
+            return (series[2], series[1]) if series else (0, 0.0)
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total, count)
+                      for key, (counts, total, count) in self._values.items()}
+        for key, (counts, total, count) in values.items():
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                yield self.name + "_bucket", dict(labels, le=_format_value(bound)), cumulative
+            yield self.name + "_sum", labels, total
+            yield self.name + "_count", labels, count
+
+
+class CallbackMetric(_Metric):
+    """
+    Gauge or counter read from func() when rendered. func returns a number,
+    or a dict mapping label value tuples to numbers; None values are skipped.
+    """
+
+    def __init__(self, name: str, help: str, func, labels: tuple = (), kind: str = "gauge"):
+        super().__init__(name, help, labels)
+        self.func = func
+        self.kind = kind
+
+    def samples(self):
+        values = self.func()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in values.items():
+            if value is not None:
+                yield self.name, dict(zip(self.labels, key)), value
+
+
+def render() -> str:
+    """All metrics in the Prometheus text format (version 0.0.4)."""
+    lines = []
+    for metric in REGISTRY:
+        try:
+            samples = list(metric.samples())
+        except Exception as e:
+            print(f"[instrumentation] {metric.name} failed: {e}")
+            continue
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in samples:
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+QUEUE_WAIT_SECONDS = Histogram(
+    "audify_queue_wait_seconds", "Time jobs waited in a scheduler queue", ("pool",))
+STAGE_SECONDS = Histogram(
+    "audify_stage_seconds", "Duration of enhancement pipeline stages per job", ("stage",))
+QUALITY_METRIC_SECONDS = Histogram(
+    "audify_quality_metric_seconds", "Time to compute each quality metric", ("metric",))
+ENHANCE_SECONDS = Histogram(
+    "audify_enhance_seconds", "Time from the start of enhancement to the output being written")
+AUDIO_SECONDS = Counter(
+    "audify_audio_seconds_total", "Seconds of input audio enhanced")
+JOBS = Counter(
+    "audify_jobs_total", "Enhancement requests by outcome", ("outcome",))
+
+
+def _real_time_factor():
+    audio = AUDIO_SECONDS.value()
+    return ENHANCE_SECONDS.totals()[1] / audio if audio else None
+
+
+CallbackMetric("audify_real_time_factor",
+               "Enhancement time per second of audio, over all jobs so far", _real_time_factor)
+
+
+@contextmanager
+def unrecorded():
+    """Drop the counts and observations the current thread makes in the block."""
+    _local.paused = True
+    try:
+        yield
+    finally:
+        _local.paused = False
+
+
+@contextmanager
+def timer(histogram: Histogram, **labels):
+    """Observe the duration of the block into histogram."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+
+@contextmanager
+def stage(name: str, on_finished=None):
+    """
+    Time one pipeline stage into STAGE_SECONDS, then call
+    on_finished(name, started, elapsed) if given. Stages that raise are
+    not recorded.
+    """
+    started = time.time()
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    STAGE_SECONDS.observe(elapsed, stage=name)
+    if on_finished is not None:
+        on_finished(name, started, elapsed)
+
+
+class StageTotals:
+    """
+    Accumulate stage timings over the blocks of a streaming job, and
+    record them once the job has finished.
+    """
+
+    def __init__(self):
+        self.started = {}
+        self.elapsed = {}
+
+    @contextmanager
+    def __call__(self, name: str):
+        self.started.setdefault(name, time.time())
+        start = time.perf_counter()
+        yield
+        self.elapsed[name] = self.elapsed.get(name, 0.0) + time.perf_counter() - start
+
+    def report(self, on_finished=None):
+        for name, elapsed in self.elapsed.items():
+            STAGE_SECONDS.observe(elapsed, stage=name)
+            if on_finished is not None:
+                on_finished(name, self.started[name], elapsed)
@@ -1,6 +1,11 @@
+import warnings
+
 import numpy as np
+from scipy import fft
 from pesq import pesq
-from pystoi.stoi import stoi
+
+from data.features import frame_signal
+from instrumentation import timer, QUALITY_METRIC_SECONDS
 
 
 FRAME_LEN = 512
@@ -8,36 +13,278 @@ OVERLAP = 256
 SR = 16000
 
 
-def segmental_snr(clean: np.ndarray, enhanced: np.ndarray, frame_len: int = FRAME_LEN, overlap: int = OVERLAP) -> float:
+def _frame_energies(clean: np.ndarray, enhanced: np.ndarray, frame_len: int, hop: int,
+                    n_frames: int):
+    """
+    Per-frame clean and error energies for one signal pair or a batch
+    (leading axis), from strided views of the squared signals.
+    """
+    clean = clean[..., :(n_frames - 1) * hop + frame_len]
+    enhanced = enhanced[..., :clean.shape[-1]]
+    signal_energy = frame_signal(clean ** 2, frame_len, hop).sum(axis=-1)
+    noise_energy = frame_signal((clean - enhanced) ** 2, frame_len, hop).sum(axis=-1)
+    return signal_energy, noise_energy
+
+
+def _masked_mean(values: np.ndarray, mask: np.ndarray, empty: float):
+    """Mean of values where mask holds, along the last axis."""
+    if values.ndim == 1:
+        selected = values[mask]
+        return float(selected.mean()) if selected.size else empty
+    rows = [_masked_mean(v, m, empty) for v, m in zip(values.reshape(-1, values.shape[-1]),
+                                                      mask.reshape(-1, mask.shape[-1]))]
+    return np.array(rows).reshape(values.shape[:-1])
+
+
+def segmental_snr(clean: np.ndarray, enhanced: np.ndarray, frame_len: int = FRAME_LEN, overlap: int = OVERLAP):
     """
     Compute segmental SNR between clean and enhanced signals.
+    Accepts single signals or batches of signal pairs (2-D arrays), in which
+    case one value per pair is returned. NaN when no frame has energy.
     """
     eps = 1e-10
-    clean = clean[:len(enhanced)]
-    snr_vals = []
+    clean = np.asarray(clean)
+    enhanced = np.asarray(enhanced)
+    length = min(clean.shape[-1], enhanced.shape[-1])
     step = frame_len - overlap
-    for i in range(0, len(clean) - frame_len, step):
-        c = clean[i:i+frame_len]
-        e = enhanced[i:i+frame_len]
-        noise = c - e
-        signal_energy = np.sum(c**2)
-        noise_energy = np.sum(noise**2) + eps
-        if signal_energy > 0:
-            snr_vals.append(10 * np.log10(signal_energy / noise_energy))
-    return float(np.mean(snr_vals))
+    n_frames = max(0, -(-(length - frame_len) // step))
+    signal_energy, noise_energy = _frame_energies(clean, enhanced, frame_len, step, n_frames)
+    noise_energy = noise_energy + eps
+    with np.errstate(divide="ignore", invalid="ignore"):
+        snr = 10 * np.log10(signal_energy / noise_energy)
+    return _masked_mean(snr, signal_energy > 0, np.nan)
+
+
+def segmental_snr_clipped(clean: np.ndarray, enhanced: np.ndarray, frame_len: int = 160,
+                          overlap: float = 0.5):
+    """
+    Segmental SNR over power-normalized frames, each clipped to [-10, 35] dB.
+    Silent or noise-free frames are skipped; overlap is a fraction of frame_len.
+    Accepts batches of signal pairs like segmental_snr; 0.0 when no frame counts.
+    """
+    clean = np.asarray(clean)
+    enhanced = np.asarray(enhanced)
+    hop_len = int(frame_len * (1 - overlap))
+    length = min(clean.shape[-1], enhanced.shape[-1])
+    n_frames = max(0, (length - frame_len) // hop_len + 1)
+    signal_energy, noise_energy = _frame_energies(clean, enhanced, frame_len, hop_len, n_frames)
+    signal_power = signal_energy / frame_len
+    noise_power = noise_energy / frame_len
+    valid = (noise_power > 1e-10) & (signal_power > 1e-10)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        snr = np.clip(10 * np.log10(signal_power / noise_power), -10, 35)
+    return _masked_mean(snr, valid, 0.0)
 
 
 def compute_pesq(clean: np.ndarray, enhanced: np.ndarray, sr: int = SR) -> float:
     """
-    Wideband PESQ score.
+    Wideband PESQ score, 0.0 if it cannot be computed.
+    Signals are resampled to 16 kHz if needed and peak-normalized.
     """
-    length = min(len(clean), len(enhanced))
-    return pesq(sr, clean[:length], enhanced[:length], 'wb')
+    try:
+        length = min(len(clean), len(enhanced))
+        clean, enhanced = clean[:length], enhanced[:length]
+        # PESQ only works with 8kHz or 16kHz
+        if sr not in [8000, 16000]:
+            from scipy import signal  # Slow to import, and only needed here
+
+            # Resample to 16kHz
+            target_sr = 16000
+            clean = signal.resample(clean, int(len(clean) * target_sr / sr))
+            enhanced = signal.resample(enhanced, int(len(enhanced) * target_sr / sr))
+        else:
+            target_sr = sr
+        
+        # Ensure minimum length (0.25 seconds)
+        min_samples = int(0.25 * target_sr)
+        if len(clean) < min_samples:
+            return 0.0
+        
+        # Normalize to prevent clipping
+        clean = clean / (np.max(np.abs(clean)) + 1e-10)
+        enhanced = enhanced / (np.max(np.abs(enhanced)) + 1e-10)
+        
+        # PESQ expects reference first, then degraded
+        return float(pesq(target_sr, clean, enhanced, 'wb'))
+    except Exception as e:
+        print(f"PESQ calculation failed: {e}")
+        return 0.0
 
 
 def compute_stoi(clean: np.ndarray, enhanced: np.ndarray, sr: int = SR) -> float:
     """
-    STOI intelligibility metric.
+    STOI intelligibility metric on peak-normalized signals, 0.0 if it
+    cannot be computed.
+    """
+    from pystoi.stoi import stoi  # Slow to import (pulls in scipy.signal)
+
+    try:
+        length = min(len(clean), len(enhanced))
+        clean_norm = clean[:length] / (np.max(np.abs(clean[:length])) + 1e-10)
+        enhanced_norm = enhanced[:length] / (np.max(np.abs(enhanced[:length])) + 1e-10)
+        return float(stoi(clean_norm, enhanced_norm, sr, extended=False))
+    except Exception as e:
+        print(f"STOI calculation failed: {e}")
+        return 0.0
+
+
+def _lag_correlation(reference: np.ndarray, test: np.ndarray, max_delay: int) -> np.ndarray:
+    """
+    Cross-correlation sum(reference[n + d] * test[n]) for d in
+    [-max_delay, max_delay], computed with zero-padded FFTs.
+    """
+    n_fft = fft.next_fast_len(max(len(reference), len(test)) + max_delay)
+    spectrum = fft.rfft(reference, n_fft) * np.conj(fft.rfft(test, n_fft))
+    circular = fft.irfft(spectrum, n_fft)
+    # Negative lags wrap around to the end of the circular correlation
+    return np.concatenate([circular[n_fft - max_delay:], circular[:max_delay + 1]])
+
+
+def _envelope(x: np.ndarray, factor: int) -> np.ndarray:
+    """
+    Mean absolute amplitude over consecutive blocks of factor samples,
+    with its own mean removed so overlap length does not bias the lag.
+    """
+    n = len(x) // factor * factor
+    env = np.abs(x[:n]).reshape(-1, factor).mean(axis=1)
+    return env - env.mean()
+
+
+def find_delay(reference: np.ndarray, test: np.ndarray, max_delay: int = None,
+               decimation: int = None) -> int:
+    """
+    Lag d in [-max_delay, max_delay] maximizing the cross-correlation of
+    reference[n + d] with test[n] (first maximum on ties, as np.argmax).
+
+    With decimation, the lag is first located on envelopes decimated by
+    that factor and then refined at full rate around it.
+    """
+    reference = np.asarray(reference, dtype=np.float64)
+    test = np.asarray(test, dtype=np.float64)
+    if max_delay is None:
+        max_delay = min(len(reference), len(test)) // 4
+    max_delay = int(min(max_delay, max(len(reference), len(test)) - 1))
+    if max_delay <= 0:
+        return 0
+
+    if not decimation or decimation <= 1:
+        return int(np.argmax(_lag_correlation(reference, test, max_delay))) - max_delay
+
+    coarse_max = max_delay // decimation
+    coarse = _lag_correlation(_envelope(reference, decimation), _envelope(test, decimation), coarse_max)
+    center = (int(np.argmax(coarse)) - coarse_max) * decimation
+    lags = np.arange(max(-max_delay, center - decimation), min(max_delay, center + decimation) + 1)
+    scores = [np.dot(reference[max(0, d):len(test) + d], test[max(0, -d):len(reference) - d]) for d in lags]
+    return int(lags[int(np.argmax(scores))])
+
+
+def align_signals(reference: np.ndarray, test: np.ndarray, max_delay: int = None,
+                  decimation: int = None):
+    """
+    Align two signals using cross-correlation, searching lags up to
+    max_delay (a quarter of the shorter signal by default).
+    """
+    delay = find_delay(reference, test, max_delay, decimation)
+    
+    # Align signals
+    if delay > 0:
+        # test is delayed
+        aligned_ref = reference[delay:]
+        aligned_test = test[:-delay] if delay < len(test) else test
+    elif delay < 0:
+        # reference is delayed
+        aligned_ref = reference[:delay]
+        aligned_test = test[-delay:]
+    else:
+        aligned_ref = reference
+        aligned_test = test
+    
+    # Ensure same length
+    min_len = min(len(aligned_ref), len(aligned_test))
+    return aligned_ref[:min_len], aligned_test[:min_len]
+
+
+METRIC_LEVELS = ("fast", "full")
+
+
+def calculate_metrics(original: np.ndarray, enhanced: np.ndarray, sr: int = SR,
+                      align_signals_flag: bool = True, level: str = "full") -> dict:
+    """
+    Calculate comprehensive audio quality metrics. The "fast" level
+    leaves out PESQ and STOI, by far the slowest of them.
     """
-    length = min(len(clean), len(enhanced))
-    return stoi(clean[:length], enhanced[:length], sr, extended=False)
\ No newline at end of file
+    if level not in METRIC_LEVELS:
+        raise ValueError(f"Unknown metrics level: {level}")
+    try:
+        # Validate inputs
+        if len(original) == 0 or len(enhanced) == 0:
+            raise ValueError("Empty audio signals")
+        
+        if sr <= 0:
+            raise ValueError("Invalid sample rate")
+        
+        # Convert to numpy arrays
+        original = np.array(original, dtype=np.float32)
+        enhanced = np.array(enhanced, dtype=np.float32)
+        
+        # Align signals if requested
+        if align_signals_flag:
+            with timer(QUALITY_METRIC_SECONDS, metric="align"):
+                original, enhanced = align_signals(original, enhanced)
+        else:
+            # Ensure same length
+            min_len = min(len(original), len(enhanced))
+            original = original[:min_len]
+            enhanced = enhanced[:min_len]
+        
+        # Check minimum length
+        if len(original) < sr * 0.1:  # At least 0.1 seconds
+            warnings.warn("Audio too short for reliable metrics")
+        
+        # Calculate metrics
+        with timer(QUALITY_METRIC_SECONDS, metric="segmental_snr"):
+            seg_snr = segmental_snr_clipped(original, enhanced)
+        
+        # Calculate SNR (improvement over original)
+        with timer(QUALITY_METRIC_SECONDS, metric="snr"):
+            noise = original - enhanced
+            signal_power = np.mean(original ** 2)
+            noise_power = np.mean(noise ** 2)
+            
+            if noise_power > 1e-10:
+                snr = 10 * np.log10(signal_power / noise_power)
+            else:
+                snr = 60.0  # Very high SNR if no noise
+        
+        # Additional metrics
+        signal_length = len(enhanced) / sr
+        signal_rms = np.sqrt(np.mean(enhanced ** 2))
+        
+        # Calculate dynamic range
+        dynamic_range = 20 * np.log10(np.max(np.abs(enhanced)) / (signal_rms + 1e-10))
+        
+        metrics = {'segmental_snr': float(seg_snr)}
+        if level == "full":
+            with timer(QUALITY_METRIC_SECONDS, metric="pesq"):
+                metrics['pesq'] = float(compute_pesq(original, enhanced, sr))
+            with timer(QUALITY_METRIC_SECONDS, metric="stoi"):
+                metrics['stoi'] = float(compute_stoi(original, enhanced, sr))
+        metrics.update({
+            'snr': float(snr),
+            'signal_length': float(signal_length),
+            'signal_rms': float(signal_rms),
+            'dynamic_range': float(dynamic_range)
+        })
+        return metrics
+        
+    except Exception as e:
+        print(f"[calculate_metrics] failed: {e}")
+        return {
+            'segmental_snr': 0.0,
+            'pesq': 0.0,
+            'stoi': 0.0,
+            'snr': 0.0,
+            'signal_length': 0.0,
+            'signal_rms': 0.0,
+            'dynamic_range': 0.0
+        }
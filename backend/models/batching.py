@@ -0,0 +1,149 @@
+"""
+Dynamic micro-batching for the frame model.
+Concurrent jobs hand their normalized frames to a BatchedPredictor, which
+merges them into a single forward pass and scatters the rows back.
+"""
+import collections
+import threading
+import time
+
+import numpy as np
+
+
+class _PredictRequest:
+    """Frames from one caller waiting for a shared forward pass."""
+
+    def __init__(self, frames: np.ndarray):
+        self.frames = frames
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class BatchedPredictor:
+    """
+    Wrap a model so that concurrent predict() calls share forward passes.
+
+    A batch is closed when it holds max_batch_frames frames or when the
+    oldest request has waited max_wait_ms, whichever comes first. A single
+    request larger than max_batch_frames is run on its own. Requests are
+    only held back for others to join while callers are arriving
+    together (more than one is queued, or the last batch merged several),
+    and only until as many have arrived as joined the last batch; a lone
+    caller, such as one real-time stream, is dispatched at once.
+    """
+
+    def __init__(self, model, max_batch_frames: int = 8192, max_wait_ms: float = 5.0):
+        self.model = model
+        self.max_batch_frames = max(1, int(max_batch_frames))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        # predict_on_batch is a single forward pass without Keras' own minibatching
+        self._forward = getattr(model, "predict_on_batch", None) or model.predict
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._last_batch_requests = 0
+        self._stats = {
+            "batches": 0,
+            "requests": 0,
+            "frames": 0,
+            "max_requests_per_batch": 0,
+            "fill_sum": 0.0
+        }
+        self._thread = threading.Thread(target=self._run, name="audify-batcher")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def predict(self, frames: np.ndarray, verbose: int = 0) -> np.ndarray:
+        """
+        Predict enhanced frames; blocks until the shared batch has run.
+        Accepts the same call signature as model.predict.
+        """
+        request = _PredictRequest(np.asarray(frames, dtype=np.float32))
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("BatchedPredictor is closed")
+            self._queue.append(request)
+            self._cond.notify()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def stats(self) -> dict:
+        """Batch-fill statistics since startup."""
+        with self._cond:
+            batches = self._stats["batches"]
+            return {
+                "max_batch_frames": self.max_batch_frames,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "batches": batches,
+                "requests": self._stats["requests"],
+                "frames": self._stats["frames"],
+                "avg_requests_per_batch": self._stats["requests"] / batches if batches else 0.0,
+                "max_requests_per_batch": self._stats["max_requests_per_batch"],
+                "avg_batch_frames": self._stats["frames"] / batches if batches else 0.0,
+                "avg_fill": self._stats["fill_sum"] / batches if batches else 0.0,
+                "pending": len(self._queue)
+            }
+
+    def close(self):
+        """Stop the batching thread once queued requests have run."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _collect(self):
+        """Block until a batch is ready and pop its requests."""
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return None
+            hold = len(self._queue) > 1 or self._last_batch_requests > 1
+            deadline = time.monotonic() + (self.max_wait if hold else 0.0)
+            # Callers that shared the last batch are likely to be back for the next
+            expected = max(2, self._last_batch_requests)
+            while True:
+                total, count = 0, 0
+                for request in self._queue:
+                    if count and total + len(request.frames) > self.max_batch_frames:
+                        break
+                    total += len(request.frames)
+                    count += 1
+                remaining = deadline - time.monotonic()
+                if total >= self.max_batch_frames or count < len(self._queue) \
+                        or count >= expected or remaining <= 0 or self._closed:
+                    break
+                self._cond.wait(remaining)
+            return [self._queue.popleft() for _ in range(count)]
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            sizes = [len(request.frames) for request in batch]
+            try:
+                frames = batch[0].frames if len(batch) == 1 else np.concatenate(
+                    [request.frames for request in batch])
+                output = np.asarray(self._forward(frames))
+                for request, part in zip(batch, np.split(output, np.cumsum(sizes)[:-1])):
+                    request.result = part
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+            finally:
+                for request in batch:
+                    request.done.set()
+
+            with self._cond:
+                self._last_batch_requests = len(batch)
+                total = sum(sizes)
+                self._stats["batches"] += 1
+                self._stats["requests"] += len(batch)
+                self._stats["frames"] += total
+                self._stats["max_requests_per_batch"] = max(
+                    self._stats["max_requests_per_batch"], len(batch))
+                self._stats["fill_sum"] += min(1.0, total / self.max_batch_frames)
@@ -2,31 +2,61 @@ import os
 import io
 import json
 import time
-from flask import Flask, request, jsonify
 
 import numpy as np
-import librosa
 import soundfile as sf
 
-from tensorflow.keras.models import Sequential, load_model as _load_model
-from tensorflow.keras.layers import Dense, Input
-
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from data.features import extract_features, butter_lowpass_filter, HOP_LENGTH, WINDOW_TYPE, SR
-from metrics.quality import segmental_snr, compute_pesq, compute_stoi
+from data.feature_store import FeatureStore
+from data.features import (
+    extract_features, load_audio, compute_features, butter_lowpass_filter,
+    stream_audio, audio_info, StreamingSTFT, StreamingISTFT, StreamingLowpass,
+    istft, amplitude_to_db, db_to_amplitude, phase_vector, lowpass_mask, HOP_LENGTH, SR
+)
+from metrics.quality import calculate_metrics, METRIC_LEVELS
+from models.numpy_model import NumpyFrameModel, export_weights, weights_version
+from instrumentation import stage, StageTotals, ENHANCE_SECONDS, AUDIO_SECONDS
 
 # Paths for saving/loading
 MODEL_PATH = "models/frame_model.keras"
 STATS_PATH = "models/norm_stats.json"
+WEIGHTS_PATH = "models/frame_model.npz"
+QUANTIZED_PATH = "models/frame_model.{mode}.npz"
+FEATURES_DIR = "features"
+CHECKPOINT_DIR = "models/checkpoints"
+TRAINING_LOG_PATH = "models/training_log.jsonl"
+
+# Dynamic range kept below the spectrogram peak, as in amplitude_to_db
+TOP_DB = 80.0
+LOWPASS_CUTOFF = 4000
+# "spectral" multiplies the magnitudes by the filter's response before the
+# iSTFT; "time" runs the IIR filter over the output waveform
+LOWPASS_MODES = ("spectral", "time")
+# Quality metrics computed after the output is written
+METRICS_MODES = ("none",) + METRIC_LEVELS
+
+# Progress (percent) reached once each enhancement stage has finished
+STAGE_PROGRESS = {
+    "decode": 10,
+    "stft": 20,
+    "predict": 55,
+    "istft": 65,
+    "filter": 70,
+    "write": 80,
+    "metrics": 99,
+}
 
 
-def build_frame_model(input_dim: int) -> Sequential:
+def build_frame_model(input_dim: int):
     """
     Build and compile a simple frame-wise DNN model.
     """
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Dense, Input
+
     model = Sequential([
         Input(shape=(input_dim,)),
         Dense(1024, activation="relu"),
@@ -61,86 +91,425 @@ def prepare_data(clean_path: str, noisy_path: str):
     return X_norm, Y_norm, mean, std
 
 
-def train_model(clean_path: str, noisy_path: str, epochs: int = 10, batch_size: int = 32):
+def _training_dataset(store: FeatureStore, names: list, batch_size: int, mean: float, std: float,
+                      shuffle: bool = True):
+    """
+    tf.data pipeline over the feature store's batches of the given pairs.
+    The generator is restarted (with a new shuffle) every epoch and batches
+    are prefetched while the previous step trains.
+    """
+    import tensorflow as tf
+
+    spec = tf.TensorSpec(shape=(None, store.n_bins), dtype=tf.float32)
+    dataset = tf.data.Dataset.from_generator(
+        lambda: store.batches(batch_size, mean, std, shuffle=shuffle, names=names),
+        output_signature=(spec, spec))
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def _save_model_atomic(model, path: str):
+    """Save a Keras model so that path is never left half-written."""
+    tmp_path = path[:-len(".keras")] + ".tmp.keras"
+    model.save(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _write_json_atomic(data: dict, path: str):
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(path + ".tmp", path)
+
+
+class _TrainingMonitor:
+    """
+    Per-epoch bookkeeping for train_model: logs loss and throughput,
+    checkpoints the model and stops training once the monitored loss
+    (validation loss when there is a validation split) has not improved
+    for patience epochs.
+
+    state.json is written last and names the checkpoint to resume from,
+    so an interrupted save leaves the previous checkpoint usable. It also
+    carries the normalization stats and early stopping counters.
+    """
+
+    def __init__(self, model, state: dict, train_frames: int, patience: int,
+                 checkpoint_dir: str = CHECKPOINT_DIR, log_path: str = TRAINING_LOG_PATH):
+        self.model = model
+        self.state = state
+        self.train_frames = train_frames
+        self.patience = patience
+        self.checkpoint_dir = checkpoint_dir
+        self.log_path = log_path
+        self.started = None
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.started = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        elapsed = time.perf_counter() - self.started
+        logs = logs or {}
+        epoch += 1
+        loss = float(logs["loss"])
+        val_loss = float(logs["val_loss"]) if "val_loss" in logs else None
+        with open(self.log_path, "a") as f:
+            f.write(json.dumps({
+                "epoch": epoch,
+                "loss": loss,
+                "val_loss": val_loss,
+                "seconds": elapsed,
+                "frames_per_sec": self.train_frames / elapsed
+            }) + "\n")
+
+        state = self.state
+        monitored = val_loss if val_loss is not None else loss
+        if state["best_loss"] is None or monitored < state["best_loss"]:
+            state.update(best_loss=monitored, best_epoch=epoch, wait=0)
+            _save_model_atomic(self.model, os.path.join(self.checkpoint_dir, "best.keras"))
+        else:
+            state["wait"] += 1
+
+        checkpoint = f"epoch-{epoch:04d}.keras"
+        _save_model_atomic(self.model, os.path.join(self.checkpoint_dir, checkpoint))
+        previous = state.get("checkpoint")
+        state.update(epoch=epoch, checkpoint=checkpoint, stopped=state["wait"] >= self.patience)
+        _write_json_atomic(state, os.path.join(self.checkpoint_dir, "state.json"))
+        if previous and previous != checkpoint:
+            os.remove(os.path.join(self.checkpoint_dir, previous))
+
+        print(f"Epoch {epoch}: loss {loss:.4f}"
+              + (f", val_loss {val_loss:.4f}" if val_loss is not None else "")
+              + f", {self.train_frames / elapsed:.0f} frames/s")
+        if state["stopped"]:
+            print(f"Early stopping: no improvement for {self.patience} epochs "
+                  f"(best epoch {state['best_epoch']})")
+            self.model.stop_training = True
+
+
+def train_model(clean_path: str, noisy_path: str, epochs: int = 10, batch_size: int = 32,
+                workers: int = None, val_split: float = 0.1, patience: int = 3,
+                resume: bool = False):
     """
     Train frame model on the given dataset.
-    Saves the trained model + stats before returning.
+    Features come from the feature store, which only extracts new or
+    changed pairs, and batches are streamed from its memory-mapped shards
+    through tf.data. Normalization stats are merged from the running
+    statistics gathered while extracting.
+
+    A val_split fraction of the pairs is held out for validation and early
+    stopping. The model is checkpointed every epoch under CHECKPOINT_DIR;
+    with resume, training continues from the latest checkpoint. Per-epoch
+    loss and throughput are appended to TRAINING_LOG_PATH.
+    Saves the best model + stats before returning.
     """
-    X, Y, mean, std = prepare_data(clean_path, noisy_path)
-    model = build_frame_model(X.shape[1])
-    history = model.fit(X, Y, epochs=epochs, batch_size=batch_size, verbose=1)
-    
+    store = FeatureStore(FEATURES_DIR)
+    counts = store.build(clean_path, noisy_path, workers=workers)
+    print(f"Features: {counts['extracted']} pairs extracted, {counts['unchanged']} up to date, "
+          f"{counts['removed']} removed")
+    if not store.entries:
+        raise ValueError(f"No matching clean/noisy pairs in {clean_path} and {noisy_path}")
+    train_names, val_names = store.split(val_split)
+    print(f"Training on {len(train_names)} pairs, validating on {len(val_names)}")
+
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    state_path = os.path.join(CHECKPOINT_DIR, "state.json")
+    if resume and os.path.exists(state_path):
+        from tensorflow.keras.models import load_model as _load_model
+
+        state = json.load(open(state_path))
+        model = _load_model(os.path.join(CHECKPOINT_DIR, state["checkpoint"]))
+        mean, std = state["mean"], state["std"]
+        print(f"Resuming after epoch {state['epoch']}")
+    else:
+        if resume:
+            print("No checkpoint found, starting from scratch")
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        if os.path.exists(TRAINING_LOG_PATH):
+            os.remove(TRAINING_LOG_PATH)
+        mean, std = store.stats(train_names)
+        state = {"epoch": 0, "checkpoint": None, "mean": mean, "std": std,
+                 "best_loss": None, "best_epoch": None, "wait": 0, "stopped": False}
+        model = build_frame_model(store.n_bins)
+
+    if state["epoch"] < epochs and not state["stopped"]:
+        from tensorflow.keras.callbacks import LambdaCallback
+
+        monitor = _TrainingMonitor(model, state, store.count_frames(train_names), patience)
+        model.fit(_training_dataset(store, train_names, batch_size, mean, std),
+                  validation_data=(_training_dataset(store, val_names, batch_size, mean, std, shuffle=False)
+                                   if val_names else None),
+                  epochs=epochs, initial_epoch=state["epoch"], verbose=1,
+                  callbacks=[LambdaCallback(on_epoch_begin=monitor.on_epoch_begin,
+                                            on_epoch_end=monitor.on_epoch_end)])
+
+    # Keep the weights of the best epoch
+    best_path = os.path.join(CHECKPOINT_DIR, "best.keras")
+    if state["best_epoch"] not in (None, state["epoch"]) and os.path.exists(best_path):
+        from tensorflow.keras.models import load_model as _load_model
+
+        model = _load_model(best_path)
+
     # Save trained artifacts
     save_trained_model(model, mean, std)
     return model, mean, std
 
 
+def _stage_reporter(update_progress=None, processing_id=None, progress: int = None):
+    """
+    on_finished callback for instrumentation.stage that reports a finished
+    stage through update_progress, at its STAGE_PROGRESS or at progress.
+    None when no progress callback is given.
+    """
+    if update_progress is None:
+        return None
+
+    def report(name, started, elapsed):
+        update_progress(processing_id, STAGE_PROGRESS[name] if progress is None else progress,
+                        stage=name, started=started, elapsed=elapsed)
+    return report
+
+
+def _enhance_streaming(model, noisy_file: str, mean: float, std: float,
+                       output_path: str = None, output_buffer: io.BytesIO = None,
+                       update_progress=None, processing_id=None, block_frames: int = 2048,
+                       lowpass: str = "spectral"):
+    """
+    Enhance a file block by block in bounded memory, writing the output
+    as it is produced. The whole-file dB floor (peak - TOP_DB) comes from
+    a first, analysis-only pass so predictions match enhance_audio.
+    Returns the duration of the input in seconds.
+    """
+    block_size = block_frames * HOP_LENGTH
+    info = audio_info(noisy_file)
+    total_frames = max(1, int(info.frames * SR / info.samplerate) // HOP_LENGTH)
+    stages = StageTotals()
+
+    # Pass 1: spectrogram peak of the whole file
+    analysis = StreamingSTFT()
+    peak = np.zeros(1, dtype=np.float32)
+    blocks = stream_audio(noisy_file, block_size)
+    while True:
+        with stages("decode"):
+            block = next(blocks, None)
+        with stages("stft"):
+            stft = analysis.process(block) if block is not None else analysis.flush()
+            if stft.shape[1]:
+                peak = np.maximum(peak, np.abs(stft).max())
+        if block is None:
+            break
+    floor_db = amplitude_to_db(peak, top_db=None)[0] - TOP_DB
+
+    # Pass 2: enhance and write each block
+    analysis = StreamingSTFT()
+    synthesis = StreamingISTFT()
+    time_lowpass = StreamingLowpass(LOWPASS_CUTOFF, SR) if lowpass == "time" else None
+    writers = []
+    if output_path:
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        writers.append(sf.SoundFile(output_path, "w", SR, 1))
+    if output_buffer is not None:
+        writers.append(sf.SoundFile(output_buffer, "w", SR, 1, format="WAV"))
+
+    def enhance_block(stft_noisy):
+        if stft_noisy.shape[1] == 0:
+            return
+        with stages("stft"):
+            feats = amplitude_to_db(stft_noisy, top_db=None)
+            np.maximum(feats, floor_db, out=feats)
+            norm_feats = (feats.T - mean) / std
+        with stages("predict"):
+            pred = model.predict(norm_feats, verbose=0)
+            pred = (pred * std) + mean
+        with stages("istft"):
+            mag = db_to_amplitude(pred.T)
+            if time_lowpass is None:
+                mag *= lowpass_mask(LOWPASS_CUTOFF, SR)
+            enhanced_stft = mag * phase_vector(stft_noisy)
+            enhanced = synthesis.process(enhanced_stft)
+        if time_lowpass is not None:
+            with stages("filter"):
+                enhanced = time_lowpass.process(enhanced)
+        with stages("write"):
+            for writer in writers:
+                writer.write(enhanced)
+
+    try:
+        done = 0
+        blocks = stream_audio(noisy_file, block_size)
+        while True:
+            with stages("decode"):
+                block = next(blocks, None)
+            if block is None:
+                break
+            stft_noisy = analysis.process(block)
+            enhance_block(stft_noisy)
+            done += stft_noisy.shape[1]
+            if update_progress is not None:
+                update_progress(processing_id, min(STAGE_PROGRESS["write"],
+                                                   int(STAGE_PROGRESS["write"] * done / total_frames)))
+        enhance_block(analysis.flush())
+        tail = synthesis.flush()
+        if time_lowpass is not None:
+            with stages("filter"):
+                tail = time_lowpass.process(tail)
+        with stages("write"):
+            for writer in writers:
+                writer.write(tail)
+    finally:
+        for writer in writers:
+            writer.close()
+
+    stages.report(_stage_reporter(update_progress, processing_id, STAGE_PROGRESS["write"]))
+    return info.frames / info.samplerate
+
+
 def enhance_audio(model, noisy_file: str, mean: float, std: float,
                   output_path: str = None,
                   output_buffer: io.BytesIO = None,
-                  update_progress=None, processing_id=None):
-    """
-    Enhance a single noisy audio file, save output, and report metrics.
-    """
-    for p in range(0, 10, 1):
-            update_progress(processing_id, p)
-            time.sleep(0.05)
-        
-    feats, y_noisy, stft_noisy = extract_features(noisy_file)
-    norm_feats = (feats - mean) / std
-    pred = model.predict(norm_feats, verbose=0)
-    pred = (pred * std) + mean
-
-    for p in range(10, 70, 1):
-            update_progress(processing_id, p)
-            time.sleep(0.05)
+                  update_progress=None, processing_id=None,
+                  block_frames: int = None, lowpass: str = "spectral",
+                  metrics: str = "full", on_written=None):
+    """
+    Enhance a single noisy audio file (a path or its bytes), save output,
+    and report metrics. Progress is reported per pipeline stage through update_progress.
+    Returns the calculate_metrics dict of the enhanced signal against
+    the noisy input at the given metrics level (one of METRICS_MODES),
+    or None for "none".
+
+    on_written(y_noisy, enhanced) is called as soon as the output has been
+    written, before any metrics are computed, so callers can hand out the
+    result early or score the signals elsewhere.
+
+    With block_frames set, the file is streamed in blocks of that many
+    STFT frames so memory stays constant for any input length; metrics
+    are not computed on this path, on_written gets (None, None) and None
+    is returned.
+
+    lowpass selects how the LOWPASS_CUTOFF filter is applied (one of
+    LOWPASS_MODES); only the "time" mode reports a filter stage.
+    """
+    if lowpass not in LOWPASS_MODES:
+        raise ValueError(f"Unknown low-pass mode: {lowpass}")
+    if metrics not in METRICS_MODES:
+        raise ValueError(f"Unknown metrics mode: {metrics}")
+    start = time.perf_counter()
+    if block_frames:
+        duration = _enhance_streaming(model, noisy_file, mean, std, output_path, output_buffer,
+                                      update_progress, processing_id, block_frames, lowpass)
+        ENHANCE_SECONDS.observe(time.perf_counter() - start)
+        AUDIO_SECONDS.inc(duration)
+        if on_written is not None:
+            on_written(None, None)
+        return None
+
+    report = _stage_reporter(update_progress, processing_id)
+    with stage("decode", report):
+        y_noisy = load_audio(noisy_file)
+
+    with stage("stft", report):
+        feats, stft_noisy = compute_features(y_noisy)
+        norm_feats = (feats - mean) / std
+
+    with stage("predict", report):
+        pred = model.predict(norm_feats, verbose=0)
+        pred = (pred * std) + mean
+
     # Reconstruct waveform
-    mag = librosa.db_to_amplitude(pred.T)
-    phase = np.angle(stft_noisy[:, :mag.shape[1]])
-    enhanced_stft = mag * np.exp(1j * phase)
-    enhanced = librosa.istft(enhanced_stft, hop_length=HOP_LENGTH, window=WINDOW_TYPE)
-    enhanced = butter_lowpass_filter(enhanced, cutoff=4000, sr=SR)
-
-    for p in range(70, 80, 5):
-            update_progress(processing_id, p)
-            time.sleep(0.05)
+    with stage("istft", report):
+        mag = db_to_amplitude(pred.T)
+        if lowpass == "spectral":
+            mag *= lowpass_mask(LOWPASS_CUTOFF, SR)
+        enhanced_stft = mag * phase_vector(stft_noisy[:, :mag.shape[1]])
+        enhanced = istft(enhanced_stft)
+
+    if lowpass == "time":
+        with stage("filter", report):
+            enhanced = butter_lowpass_filter(enhanced, cutoff=LOWPASS_CUTOFF, sr=SR)
+
     # Output to file or in-memory buffer
-    if output_path:
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        sf.write(output_path, enhanced, SR)
-    if output_buffer is not None:
-        sf.write(output_buffer, enhanced, SR, format="WAV")
+    with stage("write", report):
+        if output_path:
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            sf.write(output_path, enhanced, SR)
+        if output_buffer is not None:
+            sf.write(output_buffer, enhanced, SR, format="WAV")
 
-    for p in range(80, 99, 5):
-            update_progress(processing_id, p)
-            time.sleep(0.05)
-    # Calculate and return metrics
-    seg = segmental_snr(y_noisy, enhanced)
-    p = compute_pesq(y_noisy, enhanced)
-    s = compute_stoi(y_noisy, enhanced)
+    ENHANCE_SECONDS.observe(time.perf_counter() - start)
+    AUDIO_SECONDS.inc(len(y_noisy) / SR)
+    if on_written is not None:
+        on_written(y_noisy, enhanced)
+    if metrics == "none":
+        return None
 
-    update_progress(processing_id, 99)
-    
-    return seg, p, s
+    # Calculate and return metrics on the in-memory signals
+    with stage("metrics", report):
+        return calculate_metrics(y_noisy, enhanced, SR, level=metrics)
 
 
 def save_trained_model(model, mean, std):
     """
-    Save model (in native Keras format) and normalization stats (JSON).
+    Save model (in native Keras format), its NumPy weights export
+    and normalization stats (JSON).
     """
     os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
     model.save(MODEL_PATH)  
+    export_weights(model, WEIGHTS_PATH)
     stats = {"mean": float(mean), "std": float(std)}
     with open(STATS_PATH, "w") as f:
         json.dump(stats, f)
 
 
-def load_trained_model():
+def export_trained_model():
+    """
+    Export the weights of the saved Keras model for NumPy serving.
+    Returns the loaded Keras model.
+    """
+    from tensorflow.keras.models import load_model as _load_model
+
+    model = _load_model(MODEL_PATH)
+    export_weights(model, WEIGHTS_PATH)
+    return model
+
+
+def ensure_weights_exported() -> bool:
+    """
+    Export the Keras model for NumPy serving if the export is missing or
+    older than it. Returns whether exported weights exist.
+    """
+    has_weights = os.path.exists(WEIGHTS_PATH)
+    if os.path.exists(MODEL_PATH) and (not has_weights or
+                                       os.path.getmtime(MODEL_PATH) > os.path.getmtime(WEIGHTS_PATH)):
+        print("Exporting Keras model weights for NumPy inference...")
+        export_trained_model()
+        has_weights = True
+    return has_weights
+
+
+def load_trained_model(quantization: str = None):
     """
     Load model and stats if they exist, else return (None, None, None).
+    Serves from the NumPy weights export, so TensorFlow is only imported
+    when the export is missing or older than the Keras model.
+    With quantization ("int8" or "float16") the matching quantized
+    weights are used when they have been generated from the current
+    float32 weights.
     """
-    if os.path.exists(MODEL_PATH) and os.path.exists(STATS_PATH):
-        model = _load_model(MODEL_PATH)
-        stats = json.load(open(STATS_PATH))
+    if not os.path.exists(STATS_PATH):
+        return None, None, None
+    stats = json.load(open(STATS_PATH))
+    has_weights = ensure_weights_exported()
+    if quantization:
+        quantized_path = QUANTIZED_PATH.format(mode=quantization)
+        rerun = f"Run 'python backend/quantize_model.py --mode {quantization}' to create it."
+        if not os.path.exists(quantized_path):
+            print(f"WARNING: {quantized_path} not found, serving float32 weights. {rerun}")
+        else:
+            model = NumpyFrameModel.load(quantized_path)
+            if not has_weights or model.source == weights_version(WEIGHTS_PATH):
+                return model, stats["mean"], stats["std"]
+            print(f"WARNING: {quantized_path} was made from other weights than {WEIGHTS_PATH}, "
+                  f"serving float32 weights. {rerun.replace('create', 'update')}")
+    if has_weights:
+        model = NumpyFrameModel.load(WEIGHTS_PATH)
         return model, stats["mean"], stats["std"]
-    return None, None, None
\ No newline at end of file
+    return None, None, None
@@ -0,0 +1,185 @@
+"""
+Pure-NumPy inference for the frame model.
+The network from build_frame_model is a plain stack of Dense layers, so
+serving only needs its weights and a BLAS matmul - not TensorFlow.
+"""
+import hashlib
+import os
+
+import numpy as np
+
+# Rows per matmul, bounds the size of the hidden activations
+CHUNK_FRAMES = 4096
+
+QUANTIZATION_MODES = ("int8", "float16")
+
+# Fractions of each channel's max |weight| tried as int8 clipping range
+_CLIP_CANDIDATES = (1.0, 0.999, 0.99, 0.98, 0.95, 0.9)
+
+_ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0, out=x),
+}
+
+
+def weights_version(path: str) -> str:
+    """Content hash of a weights file, identifies the model in caches."""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def export_weights(model, path: str):
+    """
+    Write the Dense weights of a Keras frame model to an .npz file.
+    """
+    arrays = {}
+    activations = []
+    for layer in model.layers:
+        weights = layer.get_weights()
+        if not weights:
+            continue
+        activation = layer.get_config().get("activation", "linear")
+        if activation not in _ACTIVATIONS:
+            raise ValueError(f"Unsupported activation for NumPy export: {activation}")
+        kernel, bias = weights
+        arrays[f"w{len(activations)}"] = kernel.astype(np.float32)
+        arrays[f"b{len(activations)}"] = bias.astype(np.float32)
+        activations.append(activation)
+    arrays["activations"] = np.array(activations)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+def _quantize_int8(kernel: np.ndarray, clip: np.ndarray):
+    """Symmetric per-output-channel int8 quantization of a kernel."""
+    scale = (np.max(np.abs(kernel), axis=0) * clip / 127.0).astype(np.float32)
+    scale[scale == 0] = 1.0
+    q = np.clip(np.round(kernel / scale), -127, 127).astype(np.int8)
+    return q, scale
+
+
+def _calibrate_int8(kernel: np.ndarray, inputs: np.ndarray):
+    """
+    Pick the per-channel clipping range that minimizes the layer output
+    error on the calibration inputs.
+    """
+    best_err = np.full(kernel.shape[1], np.inf)
+    best_q, best_scale = None, None
+    for clip in _CLIP_CANDIDATES:
+        q, scale = _quantize_int8(kernel, np.float32(clip))
+        err = np.mean((inputs @ (q * scale - kernel)) ** 2, axis=0)
+        better = err < best_err
+        if best_q is None:
+            best_q, best_scale = q, scale
+        else:
+            best_q[:, better] = q[:, better]
+            best_scale[better] = scale[better]
+        best_err = np.minimum(best_err, err)
+    return best_q, best_scale
+
+
+def quantize_weights(path: str, out_path: str, mode: str = "int8",
+                     calibration_frames: np.ndarray = None):
+    """
+    Write a quantized copy of exported weights.
+
+    int8 stores per-output-channel scales; when calibration_frames
+    (normalized input frames) are given, each channel's clipping range
+    is chosen to minimize the layer output error on them.
+    float16 simply halves the precision of the kernels.
+    The version of the source weights is recorded, so that a copy made
+    from older weights can be recognized as stale.
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode: {mode}")
+    model = NumpyFrameModel.load(path)
+    if any(layer[0].dtype != np.float32 for layer in model.layers):
+        raise ValueError(f"Weights in {path} are already quantized")
+    arrays = {"activations": np.array([layer[3] for layer in model.layers]),
+              "format": np.array(mode),
+              "source": np.array(model.version)}
+    h = None if calibration_frames is None else np.asarray(calibration_frames, dtype=np.float32)
+    for i, (kernel, _, bias, activation) in enumerate(model.layers):
+        if mode == "float16":
+            arrays[f"w{i}"] = kernel.astype(np.float16)
+        else:
+            if h is None:
+                q, scale = _quantize_int8(kernel, np.float32(1.0))
+            else:
+                q, scale = _calibrate_int8(kernel, h)
+            arrays[f"w{i}"] = q
+            arrays[f"s{i}"] = scale
+        arrays[f"b{i}"] = bias
+        if h is not None:
+            h = _ACTIVATIONS[activation](h @ kernel + bias)
+
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    tmp_path = out_path + ".tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, out_path)
+
+
+class NumpyFrameModel:
+    """
+    Dense stack evaluated with NumPy, a drop-in for model.predict.
+    Kernels may be float32, float16 or int8 with per-channel scales;
+    reduced-precision kernels stay resident in their compact form and
+    are widened to float32 for the matmul on each call. Quantization
+    therefore only saves disk and memory: NumPy has no int8 or float16
+    GEMM, and the widening adds a fixed cost per call (about 0.1 ms for
+    int8, 1 ms for float16 with the default layer sizes), which matters
+    for the small chunks of the real-time path.
+    """
+
+    def __init__(self, layers, version: str = None, source: str = None):
+        # layers: list of (kernel, scale or None, bias, activation)
+        self.layers = [(np.ascontiguousarray(w), s, np.asarray(b, dtype=np.float32), act)
+                       for w, s, b, act in layers]
+        # Content hash of the weights file, identifies the model in caches
+        self.version = version
+        # Version of the float32 weights quantized weights were made from
+        self.source = source
+
+    @classmethod
+    def load(cls, path: str) -> "NumpyFrameModel":
+        """Load weights written by export_weights or quantize_weights."""
+        with np.load(path, allow_pickle=False) as data:
+            activations = [str(a) for a in data["activations"]]
+            layers = [(data[f"w{i}"], data[f"s{i}"] if f"s{i}" in data else None,
+                       data[f"b{i}"], act) for i, act in enumerate(activations)]
+            source = str(data["source"]) if "source" in data else None
+        return cls(layers, weights_version(path), source)
+
+    @property
+    def input_dim(self) -> int:
+        return self.layers[0][0].shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the weights."""
+        return sum(w.nbytes + b.nbytes + (0 if s is None else s.nbytes)
+                   for w, s, b, _ in self.layers)
+
+    def predict(self, x: np.ndarray, verbose: int = 0, batch_size: int = None) -> np.ndarray:
+        """
+        Forward pass over frames of shape (n, input_dim).
+        """
+        x = np.asarray(x, dtype=np.float32)
+        kernels = [w if w.dtype == np.float32 else w.astype(np.float32) for w, _, _, _ in self.layers]
+        out = np.empty((x.shape[0], self.layers[-1][0].shape[1]), dtype=np.float32)
+        for start in range(0, x.shape[0], CHUNK_FRAMES):
+            h = x[start:start + CHUNK_FRAMES]
+            for kernel, (_, scale, bias, activation) in zip(kernels, self.layers):
+                h = h @ kernel
+                if scale is not None:
+                    h *= scale
+                h += bias
+                h = _ACTIVATIONS[activation](h)
+            out[start:start + CHUNK_FRAMES] = h
+        return out
+
+    def predict_on_batch(self, x: np.ndarray) -> np.ndarray:
+        return self.predict(x)
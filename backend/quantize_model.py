@@ -0,0 +1,143 @@
+"""
+Quantize the exported frame model weights (int8 or float16).
+Calibrates on training frames and reports the PESQ/STOI change against
+float32 weights on held-out clean/noisy pairs.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import soundfile as sf
+
+from data.features import extract_features, load_audio
+from metrics.quality import compute_pesq, compute_stoi
+from models.frame_model import (
+    MODEL_PATH, STATS_PATH, WEIGHTS_PATH, QUANTIZED_PATH,
+    enhance_audio, ensure_weights_exported
+)
+from models.numpy_model import NumpyFrameModel, quantize_weights, QUANTIZATION_MODES
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mode", choices=QUANTIZATION_MODES, default="int8")
+    parser.add_argument("--clean", default=os.path.join("dataset", "clean"))
+    parser.add_argument("--noisy", default=os.path.join("dataset", "noisy"))
+    parser.add_argument("--holdout", type=float, default=0.2,
+                        help="Fraction of pairs held out for the quality report")
+    parser.add_argument("--calibration-frames", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def sample_calibration_frames(noisy_dir, files, budget, mean, std, rng):
+    """
+    Up to budget noisy frames spread evenly over files, normalized with the
+    serving stats. Files are read one at a time and only the sampled frames
+    are kept, so memory is bounded by the budget, not the dataset.
+    """
+    per_file = -(-budget // len(files))
+    chunks, total = [], 0
+    for fname in files:
+        feats, _, _ = extract_features(os.path.join(noisy_dir, fname))
+        take = min(per_file, budget - total, len(feats))
+        if take < len(feats):
+            feats = feats[np.sort(rng.choice(len(feats), take, replace=False))]
+        chunks.append(((feats - mean) / std).astype(np.float32))
+        total += take
+        if total >= budget:
+            break
+    return np.concatenate(chunks)
+
+
+def enhance_to_array(model, noisy_file, mean, std):
+    """Run enhance_audio and return the enhanced waveform."""
+    buffer = io.BytesIO()
+    enhance_audio(model, noisy_file, mean, std, output_buffer=buffer)
+    buffer.seek(0)
+    enhanced, _ = sf.read(buffer, dtype="float32")
+    return enhanced
+
+
+def score(clean, enhanced):
+    length = min(len(clean), len(enhanced))
+    return compute_pesq(clean[:length], enhanced[:length]), compute_stoi(clean[:length], enhanced[:length])
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    # Quantize the current weights, re-exporting them after a retrain
+    if not ensure_weights_exported():
+        print(f"ERROR: Trained model not found: {MODEL_PATH}")
+        sys.exit(1)
+    stats = json.load(open(STATS_PATH))
+    mean, std = stats["mean"], stats["std"]
+
+    pairs = sorted(f for f in os.listdir(args.clean) if os.path.exists(os.path.join(args.noisy, f)))
+    if not pairs:
+        print(f"ERROR: No matching clean/noisy pairs in {args.clean} and {args.noisy}")
+        sys.exit(1)
+    rng = np.random.default_rng(args.seed)
+    rng.shuffle(pairs)
+    n_holdout = min(len(pairs) - 1, max(1, int(round(len(pairs) * args.holdout)))) if len(pairs) > 1 else 0
+    holdout, calibration = pairs[:n_holdout], pairs[n_holdout:]
+
+    X = sample_calibration_frames(args.noisy, calibration, args.calibration_frames, mean, std, rng)
+
+    out_path = QUANTIZED_PATH.format(mode=args.mode)
+    quantize_weights(WEIGHTS_PATH, out_path, mode=args.mode, calibration_frames=X)
+    print(f"Quantized weights written to: {out_path}")
+
+    reference = NumpyFrameModel.load(WEIGHTS_PATH)
+    quantized = NumpyFrameModel.load(out_path)
+
+    timings = {}
+    for name, m in (("float32", reference), ("quantized", quantized)):
+        start = time.perf_counter()
+        m.predict(X)
+        timings[name] = time.perf_counter() - start
+
+    per_file = []
+    for fname in holdout:
+        clean = load_audio(os.path.join(args.clean, fname))
+        noisy_file = os.path.join(args.noisy, fname)
+        pesq_ref, stoi_ref = score(clean, enhance_to_array(reference, noisy_file, mean, std))
+        pesq_q, stoi_q = score(clean, enhance_to_array(quantized, noisy_file, mean, std))
+        per_file.append({
+            "file": fname,
+            "pesq_float32": float(pesq_ref), "pesq_quantized": float(pesq_q),
+            "stoi_float32": float(stoi_ref), "stoi_quantized": float(stoi_q)
+        })
+
+    report = {
+        "mode": args.mode,
+        "weights_bytes_float32": reference.nbytes,
+        "weights_bytes_quantized": quantized.nbytes,
+        "calibration_frames": int(len(X)),
+        "max_abs_output_diff": float(np.max(np.abs(reference.predict(X) - quantized.predict(X)))),
+        "predict_seconds_float32": timings["float32"],
+        "predict_seconds_quantized": timings["quantized"],
+        "holdout_files": len(per_file),
+        "pesq_delta": float(np.mean([f["pesq_quantized"] - f["pesq_float32"] for f in per_file])) if per_file else None,
+        "stoi_delta": float(np.mean([f["stoi_quantized"] - f["stoi_float32"] for f in per_file])) if per_file else None,
+        "files": per_file
+    }
+    report_path = os.path.join(os.path.dirname(out_path), f"quantization_report_{args.mode}.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Weights: {report['weights_bytes_float32'] / 1e6:.2f} MB -> {report['weights_bytes_quantized'] / 1e6:.2f} MB")
+    print(f"Predict time: {report['predict_seconds_float32']:.3f}s -> "
+          f"{report['predict_seconds_quantized']:.3f}s (quantization saves memory, not time)")
+    print(f"Max abs output difference: {report['max_abs_output_diff']:.4f}")
+    if per_file:
+        print(f"PESQ delta vs float32: {report['pesq_delta']:+.4f}")
+        print(f"STOI delta vs float32: {report['stoi_delta']:+.4f}")
+    print(f"Report saved to: {report_path}")
@@ -0,0 +1,147 @@
+"""
+Bounded job scheduler for Audify.
+Runs enhancement jobs on a fixed number of worker threads fed by a
+bounded FIFO queue, so bursts of uploads queue up (or are rejected)
+instead of all competing for the CPU at once.
+"""
+import collections
+import math
+import os
+import sys
+import threading
+import time
+
+from instrumentation import QUEUE_WAIT_SECONDS
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Job queue is full")
+        self.retry_after = retry_after
+
+
+class SchedulerClosedError(Exception):
+    """Raised when a job is submitted after shutdown has started."""
+
+
+def lower_thread_priority(niceness: int):
+    """
+    Raise the nice value of the calling thread by niceness. Only Linux
+    schedules threads by their own nice value; elsewhere this does nothing.
+    """
+    if niceness <= 0 or not sys.platform.startswith("linux"):
+        return
+    try:
+        tid = threading.get_native_id()
+        os.setpriority(os.PRIO_PROCESS, tid, os.getpriority(os.PRIO_PROCESS, tid) + niceness)
+    except OSError as e:
+        print(f"[scheduler] could not lower thread priority: {e}")
+
+
+class JobScheduler:
+    """
+    Fixed-size worker pool with a bounded FIFO queue and admission control.
+    initializer, if given, is called once by each worker thread on start.
+    """
+
+    def __init__(self, workers: int = 2, queue_size: int = 16, name: str = "audify-worker",
+                 initializer=None):
+        self.name = name
+        self.workers = max(1, int(workers))
+        self.queue_size = max(0, int(queue_size))
+        self._pending = collections.OrderedDict()  # job_id -> (func, args, kwargs, submitted)
+        self._cond = threading.Condition()
+        self._closed = False
+        self._running = 0
+        # Exponential moving average of job durations, used for Retry-After
+        self._avg_duration = None
+        self._initializer = initializer
+        self._threads = []
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"{name}-{i}")
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, job_id: str, func, *args, **kwargs):
+        """
+        Queue func(*args, **kwargs) under job_id.
+        Raises QueueFullError when the queue is full.
+        """
+        with self._cond:
+            if self._closed:
+                raise SchedulerClosedError("Scheduler is shutting down")
+            free_workers = max(0, self.workers - self._running)
+            if len(self._pending) >= self.queue_size + free_workers:
+                raise QueueFullError(self._retry_after())
+            self._pending[job_id] = (func, args, kwargs, time.perf_counter())
+            self._cond.notify()
+
+    def position(self, job_id: str):
+        """
+        1-based position of a queued job, 0 if it is running or finished.
+        """
+        with self._cond:
+            for i, pending_id in enumerate(self._pending):
+                if pending_id == job_id:
+                    return i + 1
+            return 0
+
+    def stats(self) -> dict:
+        """Snapshot of queue and worker usage."""
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "queued": len(self._pending),
+                "running": self._running,
+                "avg_job_seconds": self._avg_duration
+            }
+
+    def shutdown(self, wait: bool = True, timeout: float = None):
+        """
+        Stop accepting jobs and let the workers drain the queue.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            for thread in self._threads:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                thread.join(remaining)
+
+    def _retry_after(self) -> int:
+        """Seconds until a queue slot is likely to free up."""
+        if not self._avg_duration:
+            return 1
+        return max(1, math.ceil(self._avg_duration / self.workers))
+
+    def _worker(self):
+        if self._initializer is not None:
+            self._initializer()
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                job_id, (func, args, kwargs, submitted) = self._pending.popitem(last=False)
+                self._running += 1
+
+            start = time.perf_counter()
+            QUEUE_WAIT_SECONDS.observe(start - submitted, pool=self.name)
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                print(f"[scheduler] job {job_id} failed: {e}")
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._cond:
+                    self._running -= 1
+                    if self._avg_duration is None:
+                        self._avg_duration = elapsed
+                    else:
+                        self._avg_duration = 0.8 * self._avg_duration + 0.2 * elapsed
@@ -0,0 +1,285 @@
+"""
+Job status storage for Audify.
+The in-memory store serves a single process; the SQLite store (WAL mode)
+is shared by every worker process on a host, so /status works no matter
+which process handled the upload. Finished jobs expire after a TTL.
+
+Every write bumps a per-job version, which lets wait() block until a
+job changes instead of clients polling for it.
+"""
+import abc
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+
+FINISHED_STATES = ("completed", "error")
+
+
+class StatusStore(abc.ABC):
+    """Interface shared by the status store backends."""
+
+    def __init__(self, ttl: float = 3600):
+        self.ttl = ttl
+
+    @abc.abstractmethod
+    def create(self, job_id: str, record: dict):
+        """Store a new job record."""
+
+    @abc.abstractmethod
+    def get(self, job_id: str):
+        """Copy of the job record, or None if it is unknown."""
+
+    @abc.abstractmethod
+    def update(self, job_id: str, **fields):
+        """Merge top-level fields into the record."""
+
+    @abc.abstractmethod
+    def update_progress(self, job_id: str, progress: int, stage: str = None, timing: dict = None):
+        """Set progress and, optionally, the timing of a finished stage."""
+
+    @abc.abstractmethod
+    def delete(self, job_id: str):
+        """Forget a job."""
+
+    @abc.abstractmethod
+    def wait(self, job_id: str, version: int = None, timeout: float = 0):
+        """
+        Block until the job's version differs from version, at most timeout
+        seconds, and return (record, version). Without a version this
+        returns the current state immediately; record is None for an
+        unknown job.
+        """
+
+    @abc.abstractmethod
+    def expire(self) -> int:
+        """Drop jobs finished more than ttl seconds ago, return how many."""
+
+    def start_expiry(self, interval: float = 60):
+        """Run expire() periodically from a daemon thread."""
+        def sweep():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.expire()
+                except Exception as e:
+                    print(f"[status] expiry failed: {e}")
+
+        thread = threading.Thread(target=sweep, name="audify-status-expiry")
+        thread.daemon = True
+        thread.start()
+        return thread
+
+
+class MemoryStatusStore(StatusStore):
+    """Process-local store: a dict behind a lock, writers notify waiters."""
+
+    def __init__(self, ttl: float = 3600):
+        super().__init__(ttl)
+        self._jobs = {}
+        self._versions = {}
+        self._finished = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def _touch(self, job_id):
+        """Bump the job's version and wake waiters; call with the lock held."""
+        self._versions[job_id] = self._versions.get(job_id, 0) + 1
+        self._changed.notify_all()
+
+    def create(self, job_id, record):
+        with self._lock:
+            self._jobs[job_id] = copy.deepcopy(record)
+            if record.get("status") in FINISHED_STATES:
+                self._finished[job_id] = time.time()
+            self._touch(job_id)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return copy.deepcopy(job) if job is not None else None
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            if job_id not in self._jobs:
+                return
+            self._jobs[job_id].update(copy.deepcopy(fields))
+            if fields.get("status") in FINISHED_STATES:
+                self._finished[job_id] = time.time()
+            self._touch(job_id)
+
+    def update_progress(self, job_id, progress, stage=None, timing=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job["progress"] = progress
+            if stage is not None:
+                job["stage"] = stage
+                job.setdefault("stages", {})[stage] = timing
+            self._touch(job_id)
+
+    def delete(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._versions.pop(job_id, None)
+            self._finished.pop(job_id, None)
+            self._changed.notify_all()
+
+    def wait(self, job_id, version=None, timeout=0):
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while version is not None and self._versions.get(job_id, 0) == version:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+            job = self._jobs.get(job_id)
+            return (copy.deepcopy(job) if job is not None else None), self._versions.get(job_id, 0)
+
+    def expire(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [job_id for job_id, finished in self._finished.items() if finished < cutoff]
+            for job_id in expired:
+                self._jobs.pop(job_id, None)
+                self._versions.pop(job_id, None)
+                self._finished.pop(job_id, None)
+            if expired:
+                self._changed.notify_all()
+        return len(expired)
+
+
+class SQLiteStatusStore(StatusStore):
+    """
+    Store shared between processes through a SQLite database in WAL mode.
+    Status and progress live in their own columns so polling reads and
+    progress updates are single-row statements. Writers in other processes
+    cannot signal a condition variable, so wait() polls the version column.
+    """
+
+    def __init__(self, path: str, ttl: float = 3600, poll_interval: float = 0.2):
+        super().__init__(ttl)
+        self.path = path
+        self.poll_interval = poll_interval
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " status TEXT NOT NULL,"
+                " progress INTEGER NOT NULL DEFAULT 0,"
+                " data TEXT NOT NULL,"
+                " updated REAL NOT NULL,"
+                " finished REAL,"
+                " version INTEGER NOT NULL DEFAULT 1)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished)")
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]
+            if "version" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+    def _conn(self) -> sqlite3.Connection:
+        """One autocommit connection per thread."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _split(record: dict):
+        data = dict(record)
+        return data.pop("status", None), data.pop("progress", 0), data
+
+    def create(self, job_id, record):
+        status, progress, data = self._split(record)
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO jobs (id, status, progress, data, updated, finished) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, status, progress, json.dumps(data), now,
+             now if status in FINISHED_STATES else None))
+
+    def get(self, job_id):
+        return self._read(job_id)[0]
+
+    def _read(self, job_id):
+        row = self._conn().execute(
+            "SELECT status, progress, data, version FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None, 0
+        record = json.loads(row[2])
+        record["status"] = row[0]
+        record["progress"] = row[1]
+        return record, row[3]
+
+    def update(self, job_id, **fields):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT status, progress, data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is not None:
+                record = json.loads(row[2])
+                record.update(status=row[0], progress=row[1])
+                record.update(fields)
+                status, progress, data = self._split(record)
+                now = time.time()
+                conn.execute(
+                    "UPDATE jobs SET status = ?, progress = ?, data = ?, updated = ?, "
+                    "finished = COALESCE(finished, ?), version = version + 1 WHERE id = ?",
+                    (status, progress, json.dumps(data), now,
+                     now if status in FINISHED_STATES else None, job_id))
+        except BaseException:
+            # SQLite may already have rolled back after some errors
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def update_progress(self, job_id, progress, stage=None, timing=None):
+        if stage is None:
+            self._conn().execute(
+                "UPDATE jobs SET progress = ?, updated = ?, version = version + 1 WHERE id = ?",
+                (progress, time.time(), job_id))
+        else:
+            self._conn().execute(
+                "UPDATE jobs SET progress = ?, updated = ?, version = version + 1, "
+                "data = json_set(data, '$.stage', ?, '$.stages.' || ?, json(?)) WHERE id = ?",
+                (progress, time.time(), stage, stage, json.dumps(timing), job_id))
+
+    def delete(self, job_id):
+        self._conn().execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def wait(self, job_id, version=None, timeout=0):
+        deadline = time.monotonic() + timeout
+        conn = self._conn()
+        while version is not None:
+            row = conn.execute("SELECT version FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            remaining = deadline - time.monotonic()
+            if (row[0] if row else 0) != version or remaining <= 0:
+                break
+            time.sleep(min(self.poll_interval, remaining))
+        return self._read(job_id)
+
+    def expire(self):
+        cursor = self._conn().execute(
+            "DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?",
+            (time.time() - self.ttl,))
+        return cursor.rowcount
+
+
+def create_status_store(url: str = "memory", ttl: float = 3600) -> StatusStore:
+    """
+    Build a store from a URL: "memory" or "sqlite:<path>".
+    """
+    if url == "memory":
+        return MemoryStatusStore(ttl)
+    if url.startswith("sqlite:"):
+        return SQLiteStatusStore(url[len("sqlite:"):], ttl)
+    raise ValueError(f"Unknown status store: {url}")
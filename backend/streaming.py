@@ -0,0 +1,169 @@
+"""
+Real-time streaming enhancement over WebSocket.
+
+Clients send 16 kHz mono 16-bit little-endian PCM as binary messages and
+receive enhanced PCM in the same format. The text message "flush" returns
+the remaining tail and resets the stream. The server uses the same STFT
+settings as the offline pipeline; output lags input by at most N_FFT
+samples plus processing time.
+
+Waitress cannot upgrade connections, so this runs as a separate
+`websockets` server next to the Flask app.
+"""
+import asyncio
+import collections
+import threading
+import time
+
+import numpy as np
+
+from data.features import (
+    StreamingSTFT, StreamingISTFT, StreamingLowpass,
+    amplitude_to_db, db_to_amplitude, phase_vector, lowpass_mask, N_FFT, SR
+)
+from models.frame_model import TOP_DB, LOWPASS_CUTOFF
+
+# Worst-case delay added by STFT framing and overlap-add
+ALGORITHMIC_DELAY_MS = 1000.0 * N_FFT / SR
+
+
+class FrameEnhancer:
+    """
+    Per-connection enhancement state: STFT/iSTFT overlap buffers and, for
+    the "time" low-pass mode, the filter state. Since the whole signal is
+    never known, the dB floor follows the running spectrogram peak.
+    """
+
+    def __init__(self, model, mean: float, std: float, lowpass: str = "spectral"):
+        self.model = model
+        self.mean = mean
+        self.std = std
+        self.lowpass_mode = lowpass
+        self.reset()
+
+    def reset(self):
+        self.analysis = StreamingSTFT()
+        self.synthesis = StreamingISTFT()
+        self.lowpass = StreamingLowpass(LOWPASS_CUTOFF, SR) if self.lowpass_mode == "time" else None
+        self.peak = np.zeros(1, dtype=np.float32)
+        self._odd_byte = b""
+
+    def _enhance(self, stft_noisy: np.ndarray) -> np.ndarray:
+        if stft_noisy.shape[1]:
+            mag = np.abs(stft_noisy)
+            self.peak = np.maximum(self.peak, mag.max())
+            feats = amplitude_to_db(mag, top_db=None)
+            np.maximum(feats, amplitude_to_db(self.peak, top_db=None)[0] - TOP_DB, out=feats)
+            pred = self.model.predict((feats.T - self.mean) / self.std, verbose=0)
+            mag = db_to_amplitude(((pred * self.std) + self.mean).T)
+            if self.lowpass is None:
+                mag *= lowpass_mask(LOWPASS_CUTOFF, SR)
+            stft_noisy = mag * phase_vector(stft_noisy)
+        return self._filter(self.synthesis.process(stft_noisy))
+
+    def _filter(self, samples: np.ndarray) -> np.ndarray:
+        return self.lowpass.process(samples) if self.lowpass is not None else samples
+
+    def process(self, pcm: bytes) -> bytes:
+        """Enhance a chunk of int16 PCM, return the enhanced PCM ready so far."""
+        pcm = self._odd_byte + pcm
+        usable = len(pcm) - len(pcm) % 2
+        self._odd_byte = pcm[usable:]
+        samples = np.frombuffer(pcm[:usable], dtype="<i2").astype(np.float32) / 32768.0
+        return _to_pcm(self._enhance(self.analysis.process(samples)))
+
+    def flush(self) -> bytes:
+        """Return the tail of the stream and start a new one."""
+        out = self._enhance(self.analysis.flush())
+        tail = self._filter(self.synthesis.flush())
+        self.reset()
+        return _to_pcm(np.concatenate([out, tail]))
+
+
+def _to_pcm(samples: np.ndarray) -> bytes:
+    return (np.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
+
+
+class StreamStats:
+    """Latency and real-time-factor statistics across connections."""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._latencies = collections.deque(maxlen=window)
+        self.connections = 0
+        self.active = 0
+        self.audio_seconds = 0.0
+        self.processing_seconds = 0.0
+
+    def opened(self):
+        with self._lock:
+            self.connections += 1
+            self.active += 1
+
+    def closed(self):
+        with self._lock:
+            self.active -= 1
+
+    def record(self, n_bytes: int, elapsed: float):
+        with self._lock:
+            self._latencies.append(elapsed)
+            self.audio_seconds += n_bytes / 2 / SR
+            self.processing_seconds += elapsed
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000.0
+            return {
+                "connections": self.connections,
+                "active": self.active,
+                "audio_seconds": self.audio_seconds,
+                "real_time_factor": (self.processing_seconds / self.audio_seconds
+                                     if self.audio_seconds else None),
+                "algorithmic_delay_ms": ALGORITHMIC_DELAY_MS,
+                "chunk_latency_ms": {
+                    "p50": float(np.percentile(latencies, 50)) if len(latencies) else None,
+                    "p95": float(np.percentile(latencies, 95)) if len(latencies) else None,
+                    "max": float(latencies.max()) if len(latencies) else None
+                }
+            }
+
+
+stream_stats = StreamStats()
+
+
+def start_stream_server(model, mean: float, std: float, host: str = "0.0.0.0", port: int = 5001,
+                        lowpass: str = "spectral"):
+    """
+    Serve the streaming endpoint from a background thread.
+    """
+    import websockets
+
+    async def handler(websocket):
+        enhancer = FrameEnhancer(model, mean, std, lowpass)
+        loop = asyncio.get_running_loop()
+        stream_stats.opened()
+        try:
+            async for message in websocket:
+                start = time.perf_counter()
+                if isinstance(message, str):
+                    if message.strip() != "flush":
+                        continue
+                    out = await loop.run_in_executor(None, enhancer.flush)
+                else:
+                    out = await loop.run_in_executor(None, enhancer.process, message)
+                    stream_stats.record(len(message), time.perf_counter() - start)
+                if out:
+                    await websocket.send(out)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            stream_stats.closed()
+
+    async def serve_forever():
+        async with websockets.serve(handler, host, port, max_size=2 ** 20):
+            await asyncio.Future()
+
+    thread = threading.Thread(target=asyncio.run, args=(serve_forever(),), name="audify-stream")
+    thread.daemon = True
+    thread.start()
+    return thread
@@ -1,3 +1,4 @@
+import argparse
 import os
 import sys
 
@@ -7,7 +8,23 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from models.frame_model import train_model
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the Audify frame model.")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--val-split", type=float, default=0.1,
+                        help="Fraction of pairs held out for validation")
+    parser.add_argument("--patience", type=int, default=3,
+                        help="Epochs without improvement before stopping early")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Feature extraction processes")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue from the latest checkpoint in models/checkpoints")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
+    args = parse_args()
     clean_dir = os.path.join("dataset", "clean")
     noisy_dir = os.path.join("dataset", "noisy")
     
@@ -33,7 +50,10 @@ if __name__ == "__main__":
     print(f"Training model with {len(clean_files)} clean files and {len(noisy_files)} noisy files...")
     
     try:
-        model, mean, std = train_model(clean_dir, noisy_dir)
+        model, mean, std = train_model(clean_dir, noisy_dir, epochs=args.epochs,
+                                       batch_size=args.batch_size, workers=args.workers,
+                                       val_split=args.val_split, patience=args.patience,
+                                       resume=args.resume)
         print("✅ Training completed successfully!")
         print("Model saved to: backend/models/frame_model.keras")
         print("Stats saved to: backend/models/norm_stats.json")
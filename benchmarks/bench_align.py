@@ -0,0 +1,52 @@
+"""
+Benchmark FFT-based signal alignment against the original np.correlate version.
+
+    python benchmarks/bench_align.py [--seconds 5 30 300]
+
+For each length, both functions align a delayed noisy copy of a synthetic
+speech-like signal. The script checks they agree on the delay and prints
+the speedup.
+"""
+import argparse
+
+from common import best_of, speech_like
+
+import numpy as np
+
+from data.features import SR
+from metrics.quality import find_delay
+
+
+def correlate_delay(reference, test, max_delay=None):
+    """Delay search of the original align_signals: full O(N^2) correlation."""
+    if max_delay is None:
+        max_delay = min(len(reference), len(test)) // 4
+    correlation = np.correlate(reference, test, mode='full')
+    delay = np.argmax(correlation) - len(test) + 1
+    return int(np.clip(delay, -max_delay, max_delay))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, nargs="+", default=[1, 5, 30])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'length':>8} {'delay':>6} {'correlate':>11} {'fft':>9} {'fft+dec8':>9} {'speedup':>8}")
+    for seconds in args.seconds:
+        n = int(seconds * SR)
+        true_delay = int(rng.integers(-SR // 10, SR // 10))
+        source = speech_like(n + 2 * SR, rng)
+        reference = source[SR:SR + n]
+        test = source[SR - true_delay:SR - true_delay + n] + 0.05 * rng.standard_normal(n).astype(np.float32)
+
+        fft_delay, fft_time = best_of(lambda: find_delay(reference, test), args.repeats)
+        dec_delay, dec_time = best_of(lambda: find_delay(reference, test, decimation=8), args.repeats)
+        # The quadratic version gets slow quickly, run it once
+        old_delay, old_time = best_of(lambda: correlate_delay(reference, test), 1)
+
+        assert fft_delay == old_delay, f"delay mismatch: fft {fft_delay} vs correlate {old_delay}"
+        print(f"{seconds:>7g}s {fft_delay:>6d} {old_time:>10.3f}s {fft_time:>8.4f}s "
+              f"{dec_time:>8.4f}s {old_time / fft_time:>7.0f}x"
+              + ("" if dec_delay == fft_delay else f"  (decimated: {dec_delay})"))
@@ -0,0 +1,226 @@
+"""
+Benchmark suite for the enhancement and metrics pipeline.
+
+    python benchmarks/bench_pipeline.py [--suite quick|full] [--seconds 1 10 60]
+        [--output FILE] [--baseline FILE] [--save-baseline] [--tolerance 0.2]
+
+Synthetic speech-like signals (coloured noise with a syllable-rate
+envelope, mixed with white noise at 5 dB SNR and delayed by a few ms)
+are generated for each length, so no dataset is needed. The quick suite
+covers 1 s to 1 min, the full suite 1 s to 1 h. Enhancement uses a
+randomly initialized NumPy model with the layer sizes of
+build_frame_model, so no trained weights are needed either; inputs
+longer than the server's AUDIFY_STREAM_MIN_SECONDS default take the
+streaming path, as they would when served.
+
+Each case records latency percentiles over its repeats, throughput in
+seconds of audio per second, and peak RSS. Results are written as JSON;
+when a baseline exists, cases whose median latency or peak RSS grew by
+more than the tolerance (plus a small absolute slack) are flagged and
+the script exits with status 1. Record a baseline on the reference
+commit with --save-baseline.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+from common import make_signals, random_frame_model, rss_mb
+
+import numpy as np
+import scipy
+
+from data.features import extract_features, SR
+from metrics.quality import calculate_metrics, align_signals, segmental_snr, segmental_snr_clipped
+from models.frame_model import enhance_audio
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+SUITES = {
+    "quick": [1, 10, 60],
+    "full": [1, 10, 60, 600, 3600],
+}
+# Same defaults as the server (AUDIFY_STREAM_MIN_SECONDS, AUDIFY_STREAM_BLOCK_FRAMES)
+STREAM_MIN_SECONDS = 300
+STREAM_BLOCK_FRAMES = 2048
+# Changes below these are noise, not regressions
+LATENCY_SLACK_SECONDS = 0.002
+RSS_SLACK_MB = 16
+
+
+def _reset_peak_rss():
+    """Reset the kernel's peak RSS counter (Linux); False if unsupported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb(reset):
+    if reset:
+        return rss_mb("VmHWM")
+    # Without a reset only the process-wide peak is known (KB on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_case(name, seconds, func, repeats):
+    """Time func repeats times, return its result record."""
+    reset = _reset_peak_rss()
+    rss_before = rss_mb("VmRSS")
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies)
+    peak = _peak_rss_mb(reset)
+    p50 = float(np.percentile(latencies, 50))
+    return {
+        "name": name,
+        "seconds": seconds,
+        "repeats": repeats,
+        "latency": {
+            "p50": p50,
+            "p95": float(np.percentile(latencies, 95)),
+            "max": float(latencies.max()),
+            "mean": float(latencies.mean())
+        },
+        "throughput": seconds / p50 if p50 > 0 else None,
+        "peak_rss_mb": peak,
+        "rss_growth_mb": peak - rss_before if peak is not None and rss_before is not None else None
+    }
+
+
+def cases(seconds, clean, noisy, wav, model, mean, std):
+    """(name, func) of every benchmark for one signal length."""
+    block_frames = STREAM_BLOCK_FRAMES if seconds > STREAM_MIN_SECONDS else None
+    return [
+        ("extract_features", lambda: extract_features(wav)),
+        ("enhance_audio", lambda: enhance_audio(model, wav, mean, std, output_buffer=io.BytesIO(),
+                                                block_frames=block_frames, metrics="none")),
+        ("calculate_metrics", lambda: calculate_metrics(clean, noisy, SR)),
+        ("calculate_metrics_fast", lambda: calculate_metrics(clean, noisy, SR, level="fast")),
+        ("align_signals", lambda: align_signals(clean, noisy)),
+        ("segmental_snr", lambda: segmental_snr(clean, noisy)),
+        ("segmental_snr_clipped", lambda: segmental_snr_clipped(clean, noisy)),
+    ]
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Print each case against the baseline, return the regressed ones."""
+    previous = {(r["name"], r["seconds"]): r for r in baseline["results"]}
+    regressions = []
+    print(f"\nAgainst baseline {baseline['environment'].get('commit') or ''} "
+          f"(tolerance {tolerance:.0%}):")
+    print(f"{'case':>24} {'length':>7} {'p50':>9} {'baseline':>9} {'change':>8} {'peak RSS':>10}")
+    for result in results:
+        old = previous.get((result["name"], result["seconds"]))
+        if old is None:
+            continue
+        p50, old_p50 = result["latency"]["p50"], old["latency"]["p50"]
+        ratio = p50 / old_p50
+        flags = []
+        if p50 > old_p50 * (1 + tolerance) + LATENCY_SLACK_SECONDS:
+            flags.append("SLOWER")
+        rss, old_rss = result["peak_rss_mb"], old["peak_rss_mb"]
+        if rss is not None and old_rss is not None and rss > old_rss * (1 + tolerance) + RSS_SLACK_MB:
+            flags.append("MORE MEMORY")
+        if flags:
+            regressions.append((result, flags))
+        print(f"{result['name']:>24} {result['seconds']:>6g}s {result['latency']['p50']:>8.4f}s "
+              f"{old['latency']['p50']:>8.4f}s {ratio - 1:>+7.0%} "
+              f"{rss if rss is not None else float('nan'):>8.0f}MB  {' '.join(flags)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suite", choices=sorted(SUITES), default="quick")
+    parser.add_argument("--seconds", type=float, nargs="+", help="Signal lengths (overrides --suite)")
+    parser.add_argument("--repeats", type=int, default=5,
+                        help="Runs per case for signals up to a minute (longer ones run once)")
+    parser.add_argument("--only", nargs="+", help="Run only these cases")
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "latest.json"))
+    parser.add_argument("--baseline", default=os.path.join(RESULTS_DIR, "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Also write the results to the baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative growth of median latency and peak RSS")
+    args = parser.parse_args()
+
+    lengths = args.seconds or SUITES[args.suite]
+    rng = np.random.default_rng(0)
+    model = random_frame_model()
+
+    # Load the deferred imports and first-call setup outside the timings
+    clean, noisy, wav = make_signals(1, rng)
+    feats, _, _ = extract_features(wav)
+    mean, std = float(feats.mean()), float(feats.std())
+    for _, func in cases(1, clean, noisy, wav, model, mean, std):
+        func()
+
+    results = []
+    print(f"{'case':>24} {'length':>7} {'p50':>9} {'p95':>9} {'x realtime':>11} {'peak RSS':>10}")
+    for seconds in lengths:
+        clean, noisy, wav = make_signals(seconds, rng)
+        repeats = args.repeats if seconds <= 60 else 1
+        for name, func in cases(seconds, clean, noisy, wav, model, mean, std):
+            if args.only and name not in args.only:
+                continue
+            result = run_case(name, seconds, func, repeats)
+            results.append(result)
+            peak = result["peak_rss_mb"]
+            print(f"{name:>24} {seconds:>6g}s {result['latency']['p50']:>8.4f}s "
+                  f"{result['latency']['p95']:>8.4f}s {result['throughput']:>10.1f}x "
+                  f"{peak if peak is not None else float('nan'):>8.0f}MB")
+        del clean, noisy, wav
+
+    report = {"environment": environment(), "suite": args.suite if not args.seconds else None,
+              "results": results}
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults: {args.output}")
+
+    regressions = []
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s):")
+        for result, flags in regressions:
+            print(f"  {result['name']} @ {result['seconds']:g}s: {', '.join(flags)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark the spectral engine in data/features.py against librosa.
+
+    python benchmarks/bench_stft.py [--seconds 5 30 300]
+
+For each length, the analysis (STFT + dB) and synthesis (dB to amplitude,
+noisy phase, iSTFT) halves of the enhancement pipeline are timed with both
+implementations, after checking that they agree.
+"""
+import argparse
+
+from common import best_of, speech_like
+
+import librosa
+import numpy as np
+
+from data.features import (
+    stft, istft, amplitude_to_db, db_to_amplitude, phase_vector,
+    N_FFT, HOP_LENGTH, WINDOW_TYPE, SR
+)
+
+
+def librosa_analysis(y):
+    S = librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH, window=WINDOW_TYPE)
+    return librosa.amplitude_to_db(np.abs(S)), S
+
+
+def librosa_synthesis(db, S):
+    mag = librosa.db_to_amplitude(db)
+    return librosa.istft(mag * np.exp(1j * np.angle(S)), hop_length=HOP_LENGTH, window=WINDOW_TYPE)
+
+
+def native_analysis(y):
+    S = stft(y)
+    return amplitude_to_db(S), S
+
+
+def native_synthesis(db, S):
+    mag = db_to_amplitude(db)
+    return istft(mag * phase_vector(S))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, nargs="+", default=[1, 5, 30])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'length':>8} {'stage':>9} {'librosa':>9} {'native':>9} {'speedup':>8} {'max diff':>9}")
+    for seconds in args.seconds:
+        y = speech_like(int(seconds * SR), rng)
+
+        (db_ref, S_ref), t_ref = best_of(lambda: librosa_analysis(y), args.repeats)
+        (db, S), t_native = best_of(lambda: native_analysis(y), args.repeats)
+        diff = float(np.abs(db - db_ref).max())
+        assert diff < 1e-2, f"dB spectrogram mismatch: {diff}"
+        print(f"{seconds:>7g}s {'analysis':>9} {t_ref:>8.4f}s {t_native:>8.4f}s "
+              f"{t_ref / t_native:>7.1f}x {diff:>9.2e}")
+
+        out_ref, t_ref = best_of(lambda: librosa_synthesis(db_ref, S_ref), args.repeats)
+        out, t_native = best_of(lambda: native_synthesis(db, S), args.repeats)
+        diff = float(np.abs(out - out_ref).max())
+        assert out.shape == out_ref.shape and diff < 1e-3, f"waveform mismatch: {diff}"
+        print(f"{seconds:>7g}s {'synthesis':>9} {t_ref:>8.4f}s {t_native:>8.4f}s "
+              f"{t_ref / t_native:>7.1f}x {diff:>9.2e}")
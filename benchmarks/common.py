@@ -0,0 +1,78 @@
+"""
+Helpers shared by the benchmark scripts: synthetic signals, a randomly
+initialized model, timing and memory readings. Importing this module
+puts backend/ on the path.
+"""
+import io
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import numpy as np
+import soundfile as sf
+from scipy.signal import lfilter
+
+from data.features import N_FFT, SR
+from models.numpy_model import NumpyFrameModel
+
+# Hidden units of build_frame_model
+HIDDEN_UNITS = 1024
+
+
+def speech_like(n, rng):
+    """Coloured noise with a syllable-rate amplitude envelope, peak 1."""
+    x = lfilter([1.0], [1.0, -0.95], rng.standard_normal(n))
+    envelope = np.repeat(rng.random(n // 800 + 1), 800)[:n]
+    return (x * envelope / np.abs(x).max()).astype(np.float32)
+
+
+def make_signals(seconds, rng):
+    """(clean, noisy, noisy WAV bytes) for a signal of the given length."""
+    n = int(seconds * SR)
+    clean = speech_like(n, rng)
+    noise = rng.standard_normal(n).astype(np.float32)
+    noise *= np.sqrt(np.mean(clean ** 2) / np.mean(noise ** 2) / 10 ** (5 / 10))
+    delay = SR // 200
+    noisy = np.concatenate([np.zeros(delay, dtype=np.float32), clean[:-delay]]) + noise
+    noisy /= max(1.0, float(np.abs(noisy).max()))
+    wav = io.BytesIO()
+    sf.write(wav, noisy, SR, format="WAV", subtype="PCM_16")
+    return clean, noisy, wav.getvalue()
+
+
+def random_frame_model(seed=0):
+    """build_frame_model's Dense stack with Glorot-uniform weights, for NumPy serving."""
+    rng = np.random.default_rng(seed)
+    bins = N_FFT // 2 + 1
+    layers = []
+    for fan_in, fan_out, activation in ((bins, HIDDEN_UNITS, "relu"), (HIDDEN_UNITS, bins, "linear")):
+        limit = np.sqrt(6.0 / (fan_in + fan_out))
+        kernel = rng.uniform(-limit, limit, (fan_in, fan_out)).astype(np.float32)
+        layers.append((kernel, None, np.zeros(fan_out, dtype=np.float32), activation))
+    return NumpyFrameModel(layers, version="random")
+
+
+def best_of(func, repeats):
+    """(result, fastest time) of calling func repeats times."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+def rss_mb(field="VmRSS", pid="self"):
+    """A memory field (VmRSS, VmHWM) of a process in MB, from /proc (Linux); None elsewhere."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
@@ -0,0 +1,360 @@
+"""
+HTTP load test of the enhancement service, end to end.
+
+    python benchmarks/load_test.py --concurrency 8 --duration 60
+    python benchmarks/load_test.py --rate 4 --duration 60 --workers 4 --http-threads 32
+
+Starts the real app (backend/app.py) under waitress in a temporary
+working directory, serving an untrained build_frame_model with random
+weights (exported for NumPy serving, as train.py would), so no trained
+weights are needed. Clients then upload a synthetic speech-like
+recording to /enhance, follow /status by long polling until the job
+completes, and download the result from /outputs.
+
+Load is either closed-loop (--concurrency clients submitting back to
+back; a client that gets 429 waits for Retry-After) or open-loop
+(--rate jobs per second with Poisson arrivals, measured from the
+scheduled arrival so server stalls are not hidden). New jobs start for
+--duration seconds, then in-flight jobs are drained.
+
+Reported: sustained jobs per second, end-to-end and time-to-completed
+latency percentiles, error and 429 rates, and the server's RSS sampled
+over the run. --output writes the same as JSON. --url targets a server
+that is already running instead (no RSS sampling).
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import BACKEND_DIR, make_signals, rss_mb
+
+import numpy as np
+import requests
+
+from data.features import compute_features
+
+# Longest /status long-poll, within the server's AUDIFY_LONG_POLL_MAX_SECONDS default
+STATUS_WAIT_SECONDS = 25
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, default=4, help="Closed-loop clients")
+    load.add_argument("--rate", type=float, help="Open-loop arrivals per second (Poisson)")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds during which jobs start")
+    parser.add_argument("--drain-timeout", type=float, default=120,
+                        help="Seconds to wait for in-flight jobs after --duration")
+    parser.add_argument("--max-in-flight", type=int, default=256,
+                        help="Open-loop client threads; arrivals beyond this wait client-side")
+    parser.add_argument("--audio-seconds", type=float, default=10, help="Length of the uploaded recording")
+    parser.add_argument("--file", help="Upload this file instead of a synthetic recording")
+    parser.add_argument("--metrics", choices=("none", "fast", "full"),
+                        help="metrics option sent with each upload (server default if unset)")
+    parser.add_argument("--url", help="Load an already running server instead of starting one")
+    server = parser.add_argument_group("started server")
+    server.add_argument("--workers", type=int, default=2, help="AUDIFY_WORKERS")
+    server.add_argument("--queue-size", type=int, default=16, help="AUDIFY_QUEUE_SIZE")
+    server.add_argument("--http-threads", type=int, default=16, help="waitress threads")
+    server.add_argument("--cache", action="store_true",
+                        help="Keep the result cache on (repeated uploads would then be cache hits)")
+    server.add_argument("--rss-interval", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the report as JSON")
+    return parser.parse_args()
+
+
+def make_upload(args, rng):
+    """(filename, bytes) uploaded by every job."""
+    if args.file:
+        with open(args.file, "rb") as f:
+            return os.path.basename(args.file), f.read()
+    _, _, wav = make_signals(args.audio_seconds, rng)
+    return "load_test.wav", wav
+
+
+def write_stub_model(workdir, upload, seed):
+    """
+    Export an untrained build_frame_model to workdir/models, with
+    normalization stats taken from the upload's features.
+    """
+    import tensorflow as tf
+    from data.features import load_audio
+    from models.frame_model import build_frame_model, WEIGHTS_PATH, STATS_PATH
+    from models.numpy_model import export_weights
+
+    os.makedirs(os.path.join(workdir, os.path.dirname(WEIGHTS_PATH)), exist_ok=True)
+    tf.keras.utils.set_random_seed(seed)
+    feats, _ = compute_features(load_audio(upload))
+    model = build_frame_model(feats.shape[1])
+    export_weights(model, os.path.join(workdir, WEIGHTS_PATH))
+    with open(os.path.join(workdir, STATS_PATH), "w") as f:
+        json.dump({"mean": float(feats.mean()), "std": float(feats.std())}, f)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, workdir):
+    """Run app:app under waitress in workdir, return (process, base URL, log path)."""
+    port = free_port()
+    env = dict(os.environ,
+               PYTHONPATH=BACKEND_DIR,
+               AUDIFY_WORKERS=str(args.workers),
+               AUDIFY_QUEUE_SIZE=str(args.queue_size),
+               AUDIFY_HTTP_THREADS=str(args.http_threads))
+    if not args.cache:
+        env["AUDIFY_CACHE_MAX_MB"] = "0"
+    log_path = os.path.join(workdir, "server.log")
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "waitress", f"--listen=127.0.0.1:{port}",
+             f"--threads={args.http_threads}", "app:app"],
+            cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return process, f"http://127.0.0.1:{port}", log_path
+
+
+def wait_ready(base_url, process=None, timeout=120):
+    """Block until /ready answers 200."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"server exited with status {process.returncode}")
+        try:
+            if requests.get(f"{base_url}/ready", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server not ready after {timeout:.0f}s")
+
+
+class RssSampler:
+    """Sample a process' resident memory from /proc in a background thread."""
+
+    def __init__(self, pid, interval):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []  # (seconds since start, MB)
+        self._stop = threading.Event()
+        self._start = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = rss_mb("VmRSS", self.pid)
+            if rss is not None:
+                self.samples.append((round(time.monotonic() - self._start, 3), rss))
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_job(session, base_url, upload, metrics, scheduled, cleanup):
+    """
+    One upload -> status -> download round trip. Returns its record;
+    latencies are measured from the scheduled start.
+    """
+    record = {"scheduled": scheduled, "outcome": "error"}
+    try:
+        data = {"metrics": metrics} if metrics else {}
+        response = session.post(f"{base_url}/enhance", files={"audio": upload}, data=data, timeout=60)
+        if response.status_code == 429:
+            record.update(outcome="rejected", retry_after=float(response.headers.get("Retry-After", 1)))
+            return record
+        body = response.json()
+        if response.status_code != 200 or not body.get("success"):
+            record["error"] = f"enhance {response.status_code}: {body.get('error')}"
+            return record
+        processing_id = body["processing_id"]
+
+        etag = None
+        while True:
+            headers = {"If-None-Match": etag} if etag else {}
+            response = session.get(f"{base_url}/status/{processing_id}",
+                                   params={"wait": STATUS_WAIT_SECONDS}, headers=headers,
+                                   timeout=STATUS_WAIT_SECONDS + 30)
+            if response.status_code == 304:
+                continue
+            status = response.json()
+            etag = response.headers.get("ETag")
+            if status["status"] == "completed":
+                break
+            if status["status"] in ("error", "not_found"):
+                record["error"] = f"job {status['status']}: {status.get('error')}"
+                return record
+        record["completed"] = time.monotonic() - scheduled
+
+        filename = status["result"]["output_filename"]
+        response = session.get(f"{base_url}/outputs/{filename}", timeout=60)
+        if response.status_code != 200 or not response.content:
+            record["error"] = f"download {response.status_code}"
+            return record
+        record.update(outcome="ok", latency=time.monotonic() - scheduled,
+                      finished=time.monotonic(), bytes=len(response.content))
+        if cleanup:
+            try:
+                os.remove(os.path.join("/outputs", filename))
+            except OSError:
+                pass
+    except (requests.RequestException, ValueError, KeyError) as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    return record
+
+
+def closed_loop(args, base_url, upload, cleanup, start, records):
+    """--concurrency clients, each submitting its next job when the last finishes."""
+    def client():
+        session = requests.Session()
+        while time.monotonic() < start + args.duration:
+            record = run_job(session, base_url, upload, args.metrics, time.monotonic(), cleanup)
+            records.append(record)
+            if record["outcome"] == "rejected":
+                time.sleep(min(record["retry_after"], max(0.0, start + args.duration - time.monotonic())))
+
+    threads = [threading.Thread(target=client, name=f"client-{i}") for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(args.duration + args.drain_timeout)
+
+
+def open_loop(args, base_url, upload, cleanup, start, records, rng):
+    """Poisson arrivals at --rate, each job on its own client thread."""
+    local = threading.local()
+
+    def job(scheduled):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        records.append(run_job(local.session, base_url, upload, args.metrics, scheduled, cleanup))
+
+    with ThreadPoolExecutor(max_workers=args.max_in_flight) as pool:
+        scheduled = start
+        while True:
+            scheduled += rng.expovariate(args.rate)
+            if scheduled >= start + args.duration:
+                break
+            time.sleep(max(0.0, scheduled - time.monotonic()))
+            pool.submit(job, scheduled)
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = np.array(values)
+    return {"p50": float(np.percentile(values, 50)), "p90": float(np.percentile(values, 90)),
+            "p99": float(np.percentile(values, 99)), "max": float(values.max())}
+
+
+def summarize(records, start, duration, rss):
+    ok = [r for r in records if r["outcome"] == "ok"]
+    attempts = len(records)
+    # Throughput counts jobs finished while new ones were still arriving
+    sustained = [r for r in ok if r["finished"] <= start + duration]
+    errors = [r for r in records if r["outcome"] == "error"]
+    rejected = sum(r["outcome"] == "rejected" for r in records)
+    summary = {
+        "attempts": attempts,
+        "completed": len(ok),
+        "rejected": rejected,
+        "errors": len(errors),
+        "error_rate": len(errors) / attempts if attempts else 0.0,
+        "rejected_rate": rejected / attempts if attempts else 0.0,
+        "jobs_per_second": len(sustained) / duration,
+        "latency_seconds": percentiles([r["latency"] for r in ok]),
+        "time_to_completed_seconds": percentiles([r["completed"] for r in ok]),
+        "sample_errors": sorted({r["error"] for r in errors})[:5]
+    }
+    if rss:
+        values = [mb for _, mb in rss]
+        summary["server_rss_mb"] = {"start": values[0], "peak": max(values), "end": values[-1]}
+    return summary
+
+
+def print_summary(summary):
+    print(f"\nAttempts {summary['attempts']}: {summary['completed']} completed, "
+          f"{summary['rejected']} rejected (429, {summary['rejected_rate']:.1%}), "
+          f"{summary['errors']} errors ({summary['error_rate']:.1%})")
+    print(f"Sustained throughput: {summary['jobs_per_second']:.2f} jobs/s")
+    for key, label in (("latency_seconds", "End to end"), ("time_to_completed_seconds", "To completed")):
+        p = summary[key]
+        if p:
+            print(f"{label:>12}: p50 {p['p50']:.3f}s  p90 {p['p90']:.3f}s  "
+                  f"p99 {p['p99']:.3f}s  max {p['max']:.3f}s")
+    if "server_rss_mb" in summary:
+        rss = summary["server_rss_mb"]
+        print(f"  Server RSS: {rss['start']:.0f} MB at start, {rss['peak']:.0f} MB peak, "
+              f"{rss['end']:.0f} MB at end")
+    for error in summary["sample_errors"]:
+        print(f"       error: {error}")
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    upload = make_upload(args, np.random.default_rng(args.seed))
+
+    process, workdir, sampler = None, None, None
+    base_url = args.url.rstrip("/") if args.url else None
+    try:
+        if base_url is None:
+            workdir = tempfile.mkdtemp(prefix="audify-load-")
+            print(f"Exporting an untrained model to {workdir}...")
+            write_stub_model(workdir, upload[1], args.seed)
+            process, base_url, log_path = start_server(args, workdir)
+            print(f"Server log: {log_path}")
+        print(f"Waiting for {base_url}/ready...")
+        wait_ready(base_url, process)
+        if process is not None:
+            sampler = RssSampler(process.pid, args.rss_interval)
+
+        mode = f"rate {args.rate}/s" if args.rate else f"concurrency {args.concurrency}"
+        print(f"Running {args.duration:g}s at {mode} with {len(upload[1]) / 1024:.0f} KB uploads...")
+        records = []
+        start = time.monotonic()
+        if args.rate:
+            open_loop(args, base_url, upload, process is not None, start, records, rng)
+        else:
+            closed_loop(args, base_url, upload, process is not None, start, records)
+        if sampler is not None:
+            sampler.stop()
+
+        summary = summarize(records, start, args.duration, sampler.samples if sampler else None)
+        print_summary(summary)
+        if args.output:
+            config = {key: value for key, value in vars(args).items() if key != "output"}
+            with open(args.output, "w") as f:
+                json.dump({"config": config, "summary": summary,
+                           "server_rss_mb": sampler.samples if sampler else None}, f, indent=2)
+            print(f"Report: {args.output}")
+    except RuntimeError as e:
+        print(f"ERROR: {e}")
+        if workdir:
+            print(open(os.path.join(workdir, "server.log")).read()[-2000:])
+        sys.exit(1)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(10)
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,19 +6,24 @@ import os
 import sys
 import webbrowser
 import time
+import signal
 import socket
+import threading
+import _thread
 from contextlib import closing
 
-# MAKE SURE this import pulls in your Flask `app` object:
+# The Flask app is imported in main(), once the checks below have passed:
+# importing it loads the model and starts the worker threads
 sys.path.insert(0, os.path.join(os.getcwd(), 'backend'))
-from app import app   # <- now `app` is in this module’s globals
 
 def check_model_availability():
     """Check if trained model and stats files exist"""
     model_path = "backend/models/frame_model.keras"
+    weights_path = "backend/models/frame_model.npz"
     stats_path = "backend/models/norm_stats.json"
     
-    model_exists = os.path.exists(model_path)
+    # Either the Keras model or its NumPy weights export can be served
+    model_exists = os.path.exists(model_path) or os.path.exists(weights_path)
     stats_exists = os.path.exists(stats_path)
     
     return model_exists and stats_exists, model_path, stats_path
@@ -47,6 +52,29 @@ def print_training_instructions():
     print("\n💡 Training typically takes 5-15 minutes depending on dataset size.")
     print("="*60)
 
+def install_sigterm_handler():
+    """
+    On SIGTERM (docker stop), stop accepting jobs and finish the queued
+    ones within AUDIFY_DRAIN_TIMEOUT while status and downloads are still
+    served, then stop the server. Without a handler, Python as PID 1
+    would ignore SIGTERM and be killed with its jobs.
+    """
+    from api import drain_jobs
+
+    def drain_and_stop():
+        drain_jobs()
+        print("✅ Jobs drained, stopping server")
+        _thread.interrupt_main()
+
+    def handle_sigterm(signum, frame):
+        print("\n🛑 SIGTERM received, finishing queued jobs...")
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        drainer = threading.Thread(target=drain_and_stop, name='audify-drain')
+        drainer.daemon = True
+        drainer.start()
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
 def print_startup_banner():
     """Print startup banner with server info"""
     print("\n" + "="*60)
@@ -92,9 +120,17 @@ def main():
             sys.path.insert(0, os.path.join(os.getcwd(), 'backend'))
             from waitress import serve
             
+            started = time.perf_counter()
+            from app import app
+            from api import start_realtime_server, STREAM_PORT, HTTP_THREADS
+            print(f"[startup] app imported in {time.perf_counter() - started:.2f}s")
             
             print("\n🚀 Starting server...")
-            serve(app, host='0.0.0.0', port=5000)
+            if start_realtime_server():
+                print(f"🎙️ Real-time streaming: ws://localhost:{STREAM_PORT}")
+            install_sigterm_handler()
+            # Progress streams hold a thread each, so run more than waitress' default 4
+            serve(app, host='0.0.0.0', port=5000, threads=HTTP_THREADS)
             # Start Flask server
             
         except ImportError as e:
@@ -132,6 +132,11 @@ async function enhanceAudio() {
 
         console.log('Response:', response);
 
+        if (response.status === 429) {
+            const retryAfter = response.headers.get('Retry-After') || 'a few';
+            throw new Error(`Server is busy, please try again in ${retryAfter} seconds`);
+        }
+
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
@@ -143,8 +148,8 @@ async function enhanceAudio() {
             processingId = result.processing_id;
             showStatus('Processing audio...', 'processing');
 
-            // Start polling for status
-            pollProcessingStatus();
+            // Follow status updates pushed by the server
+            watchProcessingStatus();
         } else {
             throw new Error(result.error || 'Upload failed');
         }
@@ -156,26 +161,84 @@ async function enhanceAudio() {
     }
 }
 
-async function pollProcessingStatus() {
-    if (!processingId) return;
-
-    try {
-        const response = await fetch(`${API_BASE}/status/${processingId}`);
-        const status = await response.json();
-
-        if (status.status === 'completed') {
+// Apply a status update; returns true once the job and its metrics have finished
+function handleStatusUpdate(status) {
+    if (status.status === 'completed') {
+        // The enhanced audio is ready before its metrics are
+        if (enhancedFilename !== status.result.output_filename) {
             console.log('Processing completed:', status);
             handleProcessingComplete(status.result);
-        } else if (status.status === 'error') {
-            throw new Error(status.error || 'Processing failed');
-        } else {
-            // Update progress
-            updateProgress(status.progress);
+        }
+        if (status.metrics_status === 'pending' || status.metrics_status === 'running') {
+            return false;
+        }
+        handleMetrics(status);
+        return true;
+    } else if (status.status === 'error' || status.status === 'not_found') {
+        showStatus(`Error: ${status.error || 'Processing failed'}`, 'error');
+        resetUI();
+        return true;
+    } else if (status.status === 'queued') {
+        const position = status.queue_position ? ` (position ${status.queue_position})` : '';
+        showStatus(`Waiting in queue${position}...`, 'processing');
+    } else {
+        showStatus('Processing audio...', 'processing');
+        updateProgress(status.progress);
+    }
+    return false;
+}
+
+// Server-Sent Events, falling back to long polling if they are unavailable
+function watchProcessingStatus() {
+    if (!processingId) return;
+    if (!window.EventSource) {
+        pollProcessingStatus();
+        return;
+    }
 
-            // Continue polling
-            setTimeout(pollProcessingStatus, 1000);
+    const id = processingId;
+    const source = new EventSource(`${API_BASE}/status/${id}/events`);
+    let received = false;
+    source.addEventListener('status', (event) => {
+        received = true;
+        // A newer upload replaced this job while its metrics were pending
+        if (processingId !== id || handleStatusUpdate(JSON.parse(event.data))) {
+            source.close();
+        }
+    });
+    source.onerror = () => {
+        // EventSource reconnects by itself after a stream ends; give up on
+        // it only if the stream never worked or was closed for good
+        if (!received || source.readyState === EventSource.CLOSED) {
+            source.close();
+            if (processingId === id) {
+                pollProcessingStatus();
+            }
         }
+    };
+}
+
+// Long polling: the server holds the request until the status changes
+async function pollProcessingStatus(etag = null) {
+    if (!processingId) return;
 
+    try {
+        const headers = etag ? { 'If-None-Match': etag } : {};
+        const response = await fetch(`${API_BASE}/status/${processingId}?wait=25`, {
+            headers,
+            cache: 'no-store'
+        });
+        // Set when the server did not hold the request (metrics pending, or too many waiting)
+        const retryAfter = parseFloat(response.headers.get('Retry-After')) || 0;
+        const next = (nextEtag) => setTimeout(() => pollProcessingStatus(nextEtag), retryAfter * 1000);
+        if (response.status === 304) {
+            next(etag);
+            return;
+        }
+        const status = await response.json();
+        if (!handleStatusUpdate(status)) {
+            next(response.headers.get('ETag'));
+        }
     } catch (error) {
         console.error('Error polling status:', error);
         showStatus(`Error: ${error.message}`, 'error');
@@ -199,11 +262,6 @@ function handleProcessingComplete(result) {
             document.getElementById('enhancedDuration').textContent = formatDuration(enhancedAudio.duration);
         });
 
-        // Show metrics
-        // if (result.metrics) {
-        //     showMetrics(result.metrics);
-        // }
-
         document.getElementById('resultsSection').style.display = 'block';
 
         showStatus('Enhancement completed successfully!', 'success');
@@ -216,6 +274,14 @@ function handleProcessingComplete(result) {
     resetUI();
 }
 
+function handleMetrics(status) {
+    console.log('Metrics:', status.metrics_status, status.result.metrics);
+    // Show metrics
+    // if (status.result.metrics) {
+    //     showMetrics(status.result.metrics);
+    // }
+}
+
 function showMetrics(metrics) {
     const metricsGrid = document.getElementById('metricsGrid');
     //     if (!metricsGrid) {
@@ -0,0 +1,53 @@
+import os
+import time
+
+from cache import ResultCache
+
+
+def _wav(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(b"\0" * size)
+    return str(path)
+
+
+def test_stats_track_puts_without_rescanning(tmp_path):
+    root = str(tmp_path / "cache")
+    cache = ResultCache(root, max_bytes=1 << 20)
+    cache.put("a", _wav(tmp_path, "a.wav", 100), {"pesq": 1.0})
+    cache.put("b", _wav(tmp_path, "b.wav", 200), None)
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["bytes"] == 300
+
+    entry = cache.get("a", str(tmp_path / "out" / "a.wav"))
+    assert entry["metrics"] == {"pesq": 1.0}
+    assert cache.get("missing", str(tmp_path / "out" / "m.wav")) is None
+
+    # A restart rebuilds the same index from disk
+    assert ResultCache(root, max_bytes=1 << 20).stats()["bytes"] == 300
+
+
+def test_evicts_least_recently_used_over_max_bytes(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=250)
+    cache.put("a", _wav(tmp_path, "a.wav", 100), None)
+    cache.put("b", _wav(tmp_path, "b.wav", 100), None)
+    time.sleep(0.01)
+    cache.get("a", str(tmp_path / "out" / "a.wav"))
+    cache.put("c", _wav(tmp_path, "c.wav", 100), None)
+
+    assert cache.stats()["bytes"] == 200
+    assert cache.evictions == 1
+    assert cache.get("b", str(tmp_path / "out" / "b.wav")) is None
+    assert cache.get("a", str(tmp_path / "out" / "a2.wav")) is not None
+
+
+def test_startup_removes_orphaned_files(tmp_path):
+    root = tmp_path / "cache"
+    cache = ResultCache(str(root), max_bytes=1 << 20)
+    cache.put("a", _wav(tmp_path, "a.wav", 100), None)
+    # A put that failed between writing the WAV and its metadata
+    (root / "b.wav").write_bytes(b"\0" * 500)
+    (root / "c.wav.tmp").write_bytes(b"\0" * 500)
+
+    stats = ResultCache(str(root), max_bytes=1 << 20).stats()
+    assert (stats["entries"], stats["bytes"]) == (1, 100)
+    assert sorted(os.listdir(root)) == ["a.json", "a.wav"]
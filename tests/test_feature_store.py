@@ -0,0 +1,57 @@
+import os
+
+import numpy as np
+import soundfile as sf
+
+from data.feature_store import FeatureStore
+from data.features import SR
+
+
+def _write_pair(clean_dir, noisy_dir, name, seconds=0.5, seed=0):
+    rng = np.random.default_rng(seed)
+    clean = (0.1 * rng.standard_normal(int(seconds * SR))).astype(np.float32)
+    noisy = clean + (0.05 * rng.standard_normal(clean.size)).astype(np.float32)
+    sf.write(os.path.join(clean_dir, name), clean, SR)
+    sf.write(os.path.join(noisy_dir, name), noisy, SR)
+
+
+def _dataset(tmp_path):
+    clean_dir, noisy_dir = tmp_path / "clean", tmp_path / "noisy"
+    clean_dir.mkdir()
+    noisy_dir.mkdir()
+    _write_pair(clean_dir, noisy_dir, "a.wav", seed=0)
+    _write_pair(clean_dir, noisy_dir, "b.wav", seed=1)
+    return str(clean_dir), str(noisy_dir), str(tmp_path / "features")
+
+
+def test_rebuild_skips_unchanged_pairs(tmp_path):
+    clean_dir, noisy_dir, root = _dataset(tmp_path)
+    assert FeatureStore(root).build(clean_dir, noisy_dir, workers=1)["extracted"] == 2
+    assert FeatureStore(root).build(clean_dir, noisy_dir, workers=1)["extracted"] == 0
+
+
+def test_rebuild_restores_deleted_shard_file(tmp_path):
+    clean_dir, noisy_dir, root = _dataset(tmp_path)
+    store = FeatureStore(root)
+    store.build(clean_dir, noisy_dir, workers=1)
+    noisy, clean = (np.array(x) for x in store.open("a.wav"))
+    os.remove(store._shard_prefix("a.wav") + ".noisy.npy")
+
+    store = FeatureStore(root)
+    assert store.build(clean_dir, noisy_dir, workers=1)["extracted"] == 1
+    rebuilt_noisy, rebuilt_clean = store.open("a.wav")
+    np.testing.assert_array_equal(rebuilt_noisy, noisy)
+    np.testing.assert_array_equal(rebuilt_clean, clean)
+
+
+def test_rebuild_restores_truncated_shard_file(tmp_path):
+    clean_dir, noisy_dir, root = _dataset(tmp_path)
+    store = FeatureStore(root)
+    store.build(clean_dir, noisy_dir, workers=1)
+    prefix = store._shard_prefix("b.wav")
+    np.save(prefix + ".clean.npy", np.zeros((1, store.n_bins), dtype=np.float32))
+
+    store = FeatureStore(root)
+    assert store.build(clean_dir, noisy_dir, workers=1)["extracted"] == 1
+    noisy, clean = store.open("b.wav")
+    assert clean.shape == noisy.shape == (store.entries["b.wav"]["frames"], store.n_bins)
@@ -0,0 +1,70 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import requests
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Serves the app the way run.py does, with one slow job queued
+SERVER = """
+import sys, time
+sys.path.insert(0, {repo!r})
+sys.path.insert(0, {backend!r})
+import run
+from api import scheduler
+from app import app
+from waitress import serve
+
+def slow_job():
+    time.sleep(2)
+    print('job finished', flush=True)
+
+scheduler.submit('slow', slow_job)
+run.install_sigterm_handler()
+print('serving', flush=True)
+serve(app, host='127.0.0.1', port={port}, threads=4)
+print('server stopped', flush=True)
+"""
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_sigterm_drains_jobs_then_exits(tmp_path):
+    port = _free_port()
+    script = SERVER.format(repo=os.path.abspath(REPO_DIR),
+                           backend=os.path.abspath(os.path.join(REPO_DIR, "backend")), port=port)
+    env = dict(os.environ, AUDIFY_WARMUP="0", AUDIFY_CACHE_MAX_MB="0", AUDIFY_DRAIN_TIMEOUT="30")
+    process = subprocess.Popen([sys.executable, "-c", script], cwd=tmp_path, env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    try:
+        for line in process.stdout:
+            if line.strip() == "serving":
+                break
+        base_url = f"http://127.0.0.1:{port}"
+        for _ in range(100):
+            try:
+                requests.get(f"{base_url}/health", timeout=1)
+                break
+            except requests.RequestException:
+                time.sleep(0.1)
+
+        process.send_signal(signal.SIGTERM)
+        time.sleep(0.5)
+        # Still answering while the queued job runs
+        health = requests.get(f"{base_url}/health", timeout=5).json()
+        assert health["scheduler"]["running"] == 1
+
+        output, _ = process.communicate(timeout=30)
+    finally:
+        if process.poll() is None:
+            process.kill()
+    assert process.returncode == 0, output
+    assert output.index("job finished") < output.index("server stopped")